@@ -0,0 +1,76 @@
+import argparse
+import json
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from embedding_index import EmbeddingIndex
+
+
+def build_index(directory: str, rows: int, dim: int, chunk_rows: int) -> EmbeddingIndex:
+    index = EmbeddingIndex(directory, chunk_rows)
+    rng = np.random.default_rng(0)
+    meta = index.rebuild(index._read_meta(), 'benchmark', dim)
+    task_id = uuid.uuid4()
+    for start in range(0, rows, 100000):
+        size = min(100000, rows - start)
+        embeddings = rng.standard_normal((size, dim), dtype=np.float32)
+        meta = index.append(meta, embeddings, [uuid.uuid4() for _ in range(size)], [task_id] * size)
+    index._write_meta(meta)
+    index.refresh()
+    return index
+
+
+def run(args) -> list:
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        index = build_index(directory, args.rows, args.dim, args.chunk_rows)
+        build_seconds = time.perf_counter() - started
+        rng = np.random.default_rng(1)
+
+        for batch_size in args.batch_sizes:
+            queries = rng.standard_normal((batch_size, args.dim), dtype=np.float32)
+            index.search(queries, args.k)
+            latencies = []
+            for _ in range(args.repeats):
+                started = time.perf_counter()
+                index.search(queries, args.k)
+                latencies.append((time.perf_counter() - started) * 1000)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            results.append({
+                'rows': args.rows,
+                'dim': args.dim,
+                'k': args.k,
+                'batch_size': batch_size,
+                'build_seconds': round(build_seconds, 2),
+                'p50_ms': round(p50, 2),
+                'p95_ms': round(p95, 2),
+                'p99_ms': round(p99, 2),
+                'per_query_p50_ms': round(p50 / batch_size, 2),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query latency of the memory-mapped embedding index")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--dim', type=int, default=1280)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--chunk-rows', type=int, default=16384)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
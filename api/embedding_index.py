@@ -0,0 +1,287 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, select, tuple_
+
+from models import RecognitionResult, TaskSegment
+
+EMPTY_META = {'dim': 0, 'count': 0, 'capacity': 0, 'cursor': None, 'model_version': None, 'generation': 0}
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class EmbeddingIndex:
+    def __init__(self, directory: str, chunk_rows: int = 16384):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.lock_path = os.path.join(directory, 'index.lock')
+        self.meta = dict(EMPTY_META)
+        # Replaced as a whole on refresh, a search keeps the mapping it started with
+        self.snapshot = (self.meta, None, None)
+        self.buffers = threading.local()
+
+    @property
+    def count(self) -> int:
+        return self.meta['count']
+
+    @property
+    def model_version(self):
+        return self.meta.get('model_version')
+
+    @property
+    def dim(self) -> int:
+        return self.meta['dim']
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(self.meta_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return dict(EMPTY_META)
+
+    def _paths(self, meta: dict) -> tuple:
+        # A rebuild writes new files, processes still searching the old mapping keep reading it until they refresh
+        if 'generation' not in meta:
+            return os.path.join(self.directory, 'embeddings.f16'), os.path.join(self.directory, 'ids.bin')
+        generation = meta['generation']
+        return (
+            os.path.join(self.directory, f'embeddings-{generation}.f16'),
+            os.path.join(self.directory, f'ids-{generation}.bin'),
+        )
+
+    def _write_meta(self, meta: dict):
+        tmp_path = f'{self.meta_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _map(self, meta: dict, mode: str = 'r'):
+        vectors_path, ids_path = self._paths(meta)
+        vectors = np.memmap(vectors_path, dtype=np.float16, mode=mode, shape=(meta['capacity'], meta['dim']))
+        # Segment and task ids as raw UUID bytes, 16 each
+        ids = np.memmap(ids_path, dtype=np.uint8, mode=mode, shape=(meta['capacity'], 32))
+        return vectors, ids
+
+    def refresh(self):
+        # Another process may have appended rows or grown the files since the last look
+        meta = self._read_meta()
+        _, vectors, ids = self.snapshot
+        remap = (
+            vectors is None
+            or meta['capacity'] != self.meta['capacity']
+            or meta.get('generation') != self.meta.get('generation')
+        )
+        if meta['capacity'] and remap:
+            vectors, ids = self._map(meta)
+        self.snapshot = (meta, vectors, ids)
+        self.meta = meta
+
+    def _grow(self, meta: dict, required: int) -> dict:
+        capacity = max(meta['capacity'], self.chunk_rows)
+        while capacity < required:
+            capacity *= 2
+        if capacity != meta['capacity']:
+            for path, row_size in zip(self._paths(meta), (meta['dim'] * 2, 32)):
+                with open(path, 'ab') as f:
+                    f.truncate(capacity * row_size)
+        return {**meta, 'capacity': capacity}
+
+    def rebuild(self, meta: dict, model_version, dim: int) -> dict:
+        # Vectors of another model or output are not comparable, the index starts over for the new one
+        rebuilt = self._grow({
+            **EMPTY_META,
+            'dim': dim,
+            'model_version': model_version,
+            'generation': meta.get('generation', 0) + 1,
+        }, 0)
+        self._write_meta(rebuilt)
+        for path in self._paths(meta):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return rebuilt
+
+    def append(self, meta: dict, embeddings: np.ndarray, segment_ids: list, task_ids: list) -> dict:
+        if embeddings.shape[1] != meta['dim']:
+            raise ValueError(f"Embeddings of size {embeddings.shape[1]} do not fit an index of size {meta['dim']}")
+        count = meta['count']
+        meta = self._grow(meta, count + len(embeddings))
+        vectors, ids = self._map(meta, mode='r+')
+        vectors[count:count + len(embeddings)] = normalize(embeddings)
+        ids[count:count + len(embeddings), :16] = np.frombuffer(
+            b''.join(segment_id.bytes for segment_id in segment_ids), dtype=np.uint8
+        ).reshape(-1, 16)
+        ids[count:count + len(embeddings), 16:] = np.frombuffer(
+            b''.join(task_id.bytes for task_id in task_ids), dtype=np.uint8
+        ).reshape(-1, 16)
+        vectors.flush()
+        ids.flush()
+        return {**meta, 'count': count + len(embeddings)}
+
+    def _buffer(self, dim: int) -> np.ndarray:
+        # Searches run in worker threads, each thread widens chunks into its own buffer
+        buffer = getattr(self.buffers, 'buffer', None)
+        if buffer is None or buffer.shape[1] != dim:
+            buffer = self.buffers.buffer = np.empty((self.chunk_rows, dim), dtype=np.float32)
+        return buffer
+
+    def search(self, queries: np.ndarray, k: int) -> list:
+        meta, vectors, ids = self.snapshot
+        count, dim = meta['count'], meta['dim']
+        if not count:
+            return [[] for _ in queries]
+        queries = normalize(queries)
+        buffer = self._buffer(dim)
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, count, self.chunk_rows):
+            end = min(start + self.chunk_rows, count)
+            chunk = buffer[:end - start]
+            # float16 has no BLAS kernels, one chunk at a time is widened into a reused float32 buffer
+            np.copyto(chunk, vectors[start:end])
+            scores = queries @ chunk.T
+            top = min(k, end - start)
+            rows = np.argpartition(scores, -top, axis=1)[:, -top:]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, rows, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, rows + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(best_scores, -k, axis=1)[:, -k:]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [
+            [
+                (
+                    uuid.UUID(bytes=ids[row, :16].tobytes()),
+                    uuid.UUID(bytes=ids[row, 16:].tobytes()),
+                    float(score),
+                )
+                for row, score in zip(rows, scores)
+            ]
+            for rows, scores in zip(best_rows, best_scores)
+        ]
+
+    def _try_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        lock = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        return lock
+
+    @staticmethod
+    async def _first_seen(session, model_version, dim: int):
+        result = await session.execute(
+            select(func.min(RecognitionResult.created_at))
+            .where(RecognitionResult.model_version == model_version, func.length(RecognitionResult.embedding) == dim * 2)
+        )
+        return result.scalar_one_or_none()
+
+    async def _current_key(self, session, settled: datetime, meta: dict):
+        latest = (await session.execute(
+            select(RecognitionResult.model_version, func.length(RecognitionResult.embedding))
+            .where(RecognitionResult.embedding.is_not(None), RecognitionResult.created_at <= settled)
+            .order_by(RecognitionResult.created_at.desc(), RecognitionResult.id.desc())
+            .limit(1)
+        )).first()
+        if latest is None:
+            return None
+        key = (latest[0], latest[1] // 2)
+        current = (meta.get('model_version'), meta['dim'])
+        if key == current or not meta['dim']:
+            return key
+        # Jobs of a replaced model still finish after a switch, the index only moves to a model that showed up later
+        current_seen = await self._first_seen(session, *current)
+        if current_seen is None or await self._first_seen(session, *key) > current_seen:
+            return key
+        return current
+
+    async def sync(self, session_factory, settle_seconds: float, batch_size: int) -> int:
+        # Memory maps, flushes and file locks block, so they run in threads and keep the event loop free
+        lock = await asyncio.to_thread(self._try_lock)
+        if lock is None:
+            # Another API process is appending, its rows show up on the next refresh
+            await asyncio.to_thread(self.refresh)
+            return 0
+
+        added = 0
+        try:
+            meta = await asyncio.to_thread(self._read_meta)
+            # Results written within the settle window may still be in uncommitted batches
+            settled = datetime.now() - timedelta(seconds=settle_seconds)
+            async with session_factory() as session:
+                key = await self._current_key(session, settled, meta)
+            if key is None:
+                return 0
+            if key != (meta.get('model_version'), meta['dim']):
+                logging.warning(f"Embedding index switches to model {key[0]} with {key[1]} values, rebuilding it")
+                meta = await asyncio.to_thread(self.rebuild, meta, *key)
+            while True:
+                query = (
+                    select(
+                        RecognitionResult.id,
+                        RecognitionResult.created_at,
+                        RecognitionResult.segment_id,
+                        TaskSegment.task_id,
+                        RecognitionResult.embedding,
+                    )
+                    .join(TaskSegment, TaskSegment.id == RecognitionResult.segment_id)
+                    .where(
+                        RecognitionResult.embedding.is_not(None),
+                        RecognitionResult.created_at <= settled,
+                        RecognitionResult.model_version == meta['model_version'],
+                        func.length(RecognitionResult.embedding) == meta['dim'] * 2,
+                    )
+                    .order_by(RecognitionResult.created_at, RecognitionResult.id)
+                    .limit(batch_size)
+                )
+                if meta['cursor']:
+                    cursor_time, cursor_id = meta['cursor']
+                    query = query.where(
+                        tuple_(RecognitionResult.created_at, RecognitionResult.id)
+                        > tuple_(datetime.fromisoformat(cursor_time), uuid.UUID(cursor_id))
+                    )
+                async with session_factory() as session:
+                    rows = (await session.execute(query)).all()
+                if not rows:
+                    break
+
+                embeddings = np.frombuffer(b''.join(row.embedding for row in rows), dtype=np.float16)
+                meta = await asyncio.to_thread(
+                    self.append,
+                    meta,
+                    embeddings.reshape(len(rows), -1),
+                    [row.segment_id for row in rows],
+                    [row.task_id for row in rows],
+                )
+                meta['cursor'] = [rows[-1].created_at.isoformat(), str(rows[-1].id)]
+                await asyncio.to_thread(self._write_meta, meta)
+                added += len(rows)
+                if len(rows) < batch_size:
+                    break
+        finally:
+            await asyncio.to_thread(lock.close)
+
+        await asyncio.to_thread(self.refresh)
+        if added:
+            logging.info(f"Embedding index grew by {added} rows to {self.count}")
+        return added
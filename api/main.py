@@ -1,28 +1,38 @@
+import asyncio
 import logging
 import sys
 import uuid
 from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List
+from typing import List, Literal, Optional
 
+import numpy as np
 import uvicorn
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from embedding_index import EmbeddingIndex
 from models import Task, TaskSegment
 from repositories import (
     TaskRepository,
     TaskSegmentRepository,
-    RecognitionResultRepository, get_session,
+    RecognitionResultRepository, get_session, AsyncSessionLocal,
 )
+from rendering import render_annotation
 from rmq_utils import rmq
-from s3_utils import save_bytes_to_s3, create_buckets_if_not_exists
+from s3_utils import (
+    save_bytes_to_s3,
+    create_buckets_if_not_exists,
+    download_file_from_s3_to_memory,
+    get_file_from_s3_if_exists,
+)
 from schemas import (
     UploadResponse,
     TaskResponse,
     TaskSegmentResponse,
     SegmentDetailResponse,
     RecognitionResultResponse,
+    SimilarSegmentResponse,
 )
 from settings import settings
 import events
@@ -35,12 +45,40 @@ logging.basicConfig(
 )
 
 
+# Requested preview sizes snap to these, so at most one cached copy per size and segment ends up in S3
+RESULT_IMAGE_SIZES = (128, 256, 512, 1024)
+
+
+def snap_result_image_size(size: int) -> int:
+    return next((allowed for allowed in RESULT_IMAGE_SIZES if allowed >= size), RESULT_IMAGE_SIZES[-1])
+
+
+embedding_index = EmbeddingIndex(settings.embedding_index_dir, settings.embedding_index_chunk_rows)
+
+
+async def sync_embedding_index():
+    while True:
+        try:
+            await embedding_index.sync(
+                AsyncSessionLocal,
+                settings.embedding_index_settle_seconds,
+                settings.embedding_index_sync_batch,
+            )
+        except Exception as e:
+            logging.error(f"Embedding index sync failed: {e}")
+        await asyncio.sleep(settings.embedding_index_sync_interval)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await rmq.create_queue(settings.recognition_queue)
+    await rmq.create_queue(settings.photo_recognition_queue)
     await rmq.create_queue(settings.video_processing_queue)
     await create_buckets_if_not_exists()
+    embedding_index.refresh()
+    sync_task = asyncio.create_task(sync_embedding_index())
     yield
+    sync_task.cancel()
 
 
 app = FastAPI(
@@ -52,6 +90,7 @@ app = FastAPI(
 @app.post("/analysis", response_model=UploadResponse)
 async def upload_file(
     file: UploadFile = File(...),
+    scene_profile: Optional[Literal['fast', 'balanced', 'quality']] = Query(None),
     session: AsyncSession = Depends(get_session),
 ):
     task_id = str(uuid.uuid4())
@@ -80,10 +119,11 @@ async def upload_file(
             "task_id": task_id,
             "file_type": file_type,
             "input_file_url": input_file_path,
+            "scene_profile": scene_profile,
         }
         await rmq.post_message(message, queue_name)
     else:
-        queue_name = settings.recognition_queue
+        queue_name = settings.photo_recognition_queue
         segment_id = str(uuid.uuid4())
 
         task_segment_repo = TaskSegmentRepository(session)
@@ -103,6 +143,7 @@ async def upload_file(
         message = {
             "segment_id": segment_id,
             "task_id": task_id,
+            "file_type": file_type,
             "image_file_url": input_file_path,
         }
         await rmq.post_message(message, queue_name)
@@ -159,6 +200,75 @@ async def get_segment_details(
     return segment_response
 
 
+@app.get("/analysis/{task_id}/segments/{segment_id}/result-image")
+async def get_segment_result_image(
+    task_id: str,
+    segment_id: str,
+    size: Optional[int] = Query(None, ge=16, le=4096),
+    session: AsyncSession = Depends(get_session),
+):
+    task_segment_repo = TaskSegmentRepository(session)
+    recognition_result_repo = RecognitionResultRepository(session)
+
+    segment = await task_segment_repo.get_segment(task_id, segment_id)
+    if not segment:
+        raise HTTPException(status_code=404, detail="Segment not found")
+
+    recognition_results = await recognition_result_repo.get_results_by_segment_id(
+        segment_id
+    )
+    if not recognition_results or not segment.segment_file_url:
+        raise HTTPException(status_code=404, detail="Recognition result not found")
+
+    if size is None:
+        result_file_url = f"recognition-results/{task_id}/{segment_id}_result.jpg"
+    else:
+        size = snap_result_image_size(size)
+        result_file_url = f"recognition-results/{task_id}/{segment_id}_result_{size}.jpg"
+
+    image_bytes = await get_file_from_s3_if_exists(result_file_url)
+    if image_bytes is None:
+        source_image = await download_file_from_s3_to_memory(segment.segment_file_url)
+        image_bytes = await asyncio.to_thread(
+            render_annotation, source_image, recognition_results, size
+        )
+        await save_bytes_to_s3(image_bytes, result_file_url)
+
+    return Response(content=image_bytes, media_type="image/jpeg")
+
+
+@app.get("/analysis/{task_id}/segments/{segment_id}/similar", response_model=List[SimilarSegmentResponse])
+async def get_similar_segments(
+    task_id: str,
+    segment_id: str,
+    limit: int = Query(10, ge=1, le=100),
+    session: AsyncSession = Depends(get_session),
+):
+    task_segment_repo = TaskSegmentRepository(session)
+    recognition_result_repo = RecognitionResultRepository(session)
+
+    segment = await task_segment_repo.get_segment(task_id, segment_id)
+    if not segment:
+        raise HTTPException(status_code=404, detail="Segment not found")
+
+    # Only an embedding of the model the index was built from is comparable with it
+    embedding = await recognition_result_repo.get_latest_embedding(segment_id, embedding_index.model_version)
+    if embedding is None or len(embedding) != embedding_index.dim * 2:
+        raise HTTPException(status_code=404, detail="Segment has no embedding")
+
+    query = np.frombuffer(embedding, dtype=np.float16)[np.newaxis]
+    # Extra candidates make up for the segment itself and segments deleted since they were indexed
+    candidates = (await asyncio.to_thread(embedding_index.search, query, limit * 2 + 1))[0]
+    candidates = [candidate for candidate in candidates if candidate[0] != segment.id]
+    existing = await task_segment_repo.get_existing_segment_ids([candidate[0] for candidate in candidates])
+
+    return [
+        SimilarSegmentResponse(task_id=str(found_task_id), segment_id=str(found_segment_id), score=score)
+        for found_segment_id, found_task_id, score in candidates
+        if found_segment_id in existing
+    ][:limit]
+
+
 @app.delete("/analysis/{task_id}", response_model=TaskResponse)
 async def delete_task(task_id: str, session: AsyncSession = Depends(get_session)):
     task_repo = TaskRepository(session)
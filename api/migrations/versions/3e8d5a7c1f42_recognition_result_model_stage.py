@@ -0,0 +1,26 @@
+"""recognition result model stage
+
+Revision ID: 3e8d5a7c1f42
+Revises: 9b1c2f4e7a10
+Create Date: 2026-10-17 13:40:08.517392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e8d5a7c1f42'
+down_revision: Union[str, None] = '9b1c2f4e7a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('recognition_results', sa.Column('model_stage', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('recognition_results', 'model_stage')
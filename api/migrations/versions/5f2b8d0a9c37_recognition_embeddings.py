@@ -0,0 +1,32 @@
+"""recognition embeddings
+
+Revision ID: 5f2b8d0a9c37
+Revises: c4a9e1d6b2f8
+Create Date: 2026-10-17 17:26:41.390521
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f2b8d0a9c37'
+down_revision: Union[str, None] = 'c4a9e1d6b2f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('recognition_results', sa.Column('embedding', sa.LargeBinary(), nullable=True))
+    op.add_column('recognition_cache', sa.Column('embedding', sa.LargeBinary(), nullable=True))
+    op.create_index(
+        'ix_recognition_results_created_at_id', 'recognition_results', ['created_at', 'id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_recognition_results_created_at_id', table_name='recognition_results')
+    op.drop_column('recognition_cache', 'embedding')
+    op.drop_column('recognition_results', 'embedding')
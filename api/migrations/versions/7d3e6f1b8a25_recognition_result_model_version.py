@@ -0,0 +1,26 @@
+"""recognition result model version
+
+Revision ID: 7d3e6f1b8a25
+Revises: 5f2b8d0a9c37
+Create Date: 2026-10-17 19:48:12.660934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d3e6f1b8a25'
+down_revision: Union[str, None] = '5f2b8d0a9c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('recognition_results', sa.Column('model_version', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('recognition_results', 'model_version')
@@ -0,0 +1,34 @@
+"""recognition cache
+
+Revision ID: 9b1c2f4e7a10
+Revises: 05a26dd30e00
+Create Date: 2026-10-17 10:12:41.204318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b1c2f4e7a10'
+down_revision: Union[str, None] = '05a26dd30e00'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('recognition_cache',
+    sa.Column('image_hash', sa.String(), nullable=False),
+    sa.Column('model_version', sa.String(), nullable=False),
+    sa.Column('object_detected', sa.String(), nullable=False),
+    sa.Column('confidence', sa.Float(), nullable=False),
+    sa.Column('result_file_url', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('image_hash', 'model_version')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('recognition_cache')
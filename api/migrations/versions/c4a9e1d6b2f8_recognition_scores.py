@@ -0,0 +1,28 @@
+"""recognition scores
+
+Revision ID: c4a9e1d6b2f8
+Revises: 3e8d5a7c1f42
+Create Date: 2026-10-17 15:02:53.118064
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a9e1d6b2f8'
+down_revision: Union[str, None] = '3e8d5a7c1f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('recognition_results', sa.Column('scores', sa.LargeBinary(), nullable=True))
+    op.add_column('recognition_cache', sa.Column('scores', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('recognition_cache', 'scores')
+    op.drop_column('recognition_results', 'scores')
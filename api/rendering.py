@@ -0,0 +1,35 @@
+import cv2
+import numpy as np
+
+
+def render_annotation(image_data: bytes, results: list, max_side: int = None) -> bytes:
+    image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Failed to read image")
+
+    scale = 1.0
+    height, width = image.shape[:2]
+    if max_side and max(height, width) > max_side:
+        scale = max_side / max(height, width)
+        image = cv2.resize(
+            image,
+            (max(1, round(width * scale)), max(1, round(height * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+
+    font_scale = max(0.4, scale)
+    thickness = 1 if font_scale < 0.7 else 2
+    line_height = int(35 * font_scale)
+    for idx, result in enumerate(results):
+        cv2.putText(
+            image,
+            f'{result.object_detected}: {result.confidence:.2f}',
+            (10, int(30 * font_scale) + idx * line_height),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            font_scale,
+            (0, 255, 0),
+            thickness,
+        )
+
+    _, buffer = cv2.imencode('.jpg', image)
+    return buffer.tobytes()
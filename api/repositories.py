@@ -77,6 +77,12 @@ class TaskSegmentRepository:
         )
         return result.scalar_one_or_none()
 
+    async def get_existing_segment_ids(self, segment_ids: list) -> set:
+        result = await self.session.execute(
+            select(TaskSegment.id).where(TaskSegment.id.in_(segment_ids))
+        )
+        return set(result.scalars().all())
+
 
 class RecognitionResultRepository:
     def __init__(self, session: AsyncSession):
@@ -89,3 +95,16 @@ class RecognitionResultRepository:
             select(RecognitionResult).where(RecognitionResult.segment_id == segment_id)
         )
         return result.scalars().all()
+
+    async def get_latest_embedding(self, segment_id: str, model_version: Optional[str]) -> Optional[bytes]:
+        result = await self.session.execute(
+            select(RecognitionResult.embedding)
+            .where(
+                RecognitionResult.segment_id == segment_id,
+                RecognitionResult.embedding.is_not(None),
+                RecognitionResult.model_version == model_version,
+            )
+            .order_by(RecognitionResult.created_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
@@ -1,4 +1,5 @@
 import aioboto3
+from botocore.exceptions import ClientError
 from settings import settings
 
 s3_session = aioboto3.Session()
@@ -65,10 +66,19 @@ async def download_file_from_s3_to_memory(bucket_key):
         aws_access_key_id=settings.s3_access_key,
         aws_secret_access_key=settings.s3_secret_key,
     ) as s3_client:
-        response = await s3_client.get_object(Bucket=settings.MINIO_BUCKET, Key=bucket_key)
+        response = await s3_client.get_object(Bucket=settings.s3_bucket, Key=bucket_key)
         data = await response['Body'].read()
         return data
 
+
+async def get_file_from_s3_if_exists(bucket_key):
+    try:
+        return await download_file_from_s3_to_memory(bucket_key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+
 async def delete_folder_from_s3(folder_prefix):
     async with s3_session.client(
             "s3",
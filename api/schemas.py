@@ -54,6 +54,8 @@ class RecognitionResultResponse(BaseModel):
     object_detected: str
     confidence: float
     result_file_url: Optional[str] = None
+    model_stage: Optional[str] = None
+    model_version: Optional[str] = None
     created_at: datetime
 
     model_config = ConfigDict(
@@ -61,6 +63,12 @@ class RecognitionResultResponse(BaseModel):
     )
 
 
+class SimilarSegmentResponse(BaseModel):
+    task_id: str
+    segment_id: str
+    score: float
+
+
 class SegmentDetailResponse(BaseModel):
     id: str = Field(alias="segment_id")
     start_time: Optional[float] = None
@@ -35,6 +35,30 @@ class Settings(BaseSettings):
         default='recognition_queue',
         validation_alias='RECOGNITION_QUEUE'
     )
+    photo_recognition_queue: str = Field(
+        default='photo_recognition_queue',
+        validation_alias='PHOTO_RECOGNITION_QUEUE'
+    )
+    embedding_index_dir: str = Field(
+        default='embedding_index',
+        validation_alias='EMBEDDING_INDEX_DIR'
+    )
+    embedding_index_chunk_rows: int = Field(
+        default=16384,
+        validation_alias='EMBEDDING_INDEX_CHUNK_ROWS'
+    )
+    embedding_index_sync_interval: float = Field(
+        default=5.0,
+        validation_alias='EMBEDDING_INDEX_SYNC_INTERVAL'
+    )
+    embedding_index_sync_batch: int = Field(
+        default=10000,
+        validation_alias='EMBEDDING_INDEX_SYNC_BATCH'
+    )
+    embedding_index_settle_seconds: float = Field(
+        default=5.0,
+        validation_alias='EMBEDDING_INDEX_SETTLE_SECONDS'
+    )
 
     model_config = ConfigDict(extra="ignore")
 
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import json
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from models import RecognitionResult, Task, TaskSegment
+from settings import settings
+
+
+def build_query(args):
+    query = (
+        select(
+            Task.id,
+            Task.created_at,
+            func.count(func.distinct(TaskSegment.id)).label('segments'),
+            func.min(TaskSegment.created_at).label('first_segment_at'),
+            func.min(RecognitionResult.created_at).label('first_result_at'),
+            func.max(RecognitionResult.created_at).label('last_result_at'),
+        )
+        .join(TaskSegment, TaskSegment.task_id == Task.id)
+        .join(RecognitionResult, RecognitionResult.segment_id == TaskSegment.id)
+        .where(Task.file_type == 'video')
+        .group_by(Task.id, Task.created_at)
+    )
+    if args.task_id:
+        query = query.where(Task.id == args.task_id)
+    if args.since:
+        query = query.where(Task.created_at >= args.since)
+    if args.until:
+        query = query.where(Task.created_at < args.until)
+    return query
+
+
+def summarize(values: list) -> dict:
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': round(p50, 2), 'p95': round(p95, 2), 'p99': round(p99, 2), 'max': round(max(values), 2)}
+
+
+async def run(args) -> dict:
+    engine = create_async_engine(args.database_url, echo=False)
+    try:
+        async with engine.connect() as connection:
+            rows = (await connection.execute(build_query(args))).all()
+    finally:
+        await engine.dispose()
+
+    videos = [
+        {
+            'task_id': str(row.id),
+            'segments': row.segments,
+            'first_segment_seconds': round((row.first_segment_at - row.created_at).total_seconds(), 2),
+            'first_result_seconds': round((row.first_result_at - row.created_at).total_seconds(), 2),
+            'end_to_end_seconds': round((row.last_result_at - row.created_at).total_seconds(), 2),
+        }
+        for row in rows
+    ]
+    return {
+        'videos': len(videos),
+        'first_result_seconds': summarize([video['first_result_seconds'] for video in videos]),
+        'end_to_end_seconds': summarize([video['end_to_end_seconds'] for video in videos]),
+        'per_video': videos if args.per_video else [],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time from upload to the first and the last recognition result of each video"
+    )
+    parser.add_argument('--task-id', default=None)
+    parser.add_argument('--since', type=datetime.fromisoformat, default=None, help="Task creation time, ISO format")
+    parser.add_argument('--until', type=datetime.fromisoformat, default=None)
+    parser.add_argument('--per-video', action='store_true')
+    parser.add_argument('--database-url', default=settings.database_url)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ffmpeg
+
+from scene_detection import PROFILES, detect_scenes, detect_scenes_chunked
+
+
+def make_video(path: str, duration: float, width: int, height: int, fps: int, scene_length: float):
+    # The hue jumps every `scene_length` seconds, which gives the detectors a hard cut to find
+    (
+        ffmpeg
+        .input(f'testsrc2=size={width}x{height}:rate={fps}:duration={duration}', f='lavfi')
+        .filter('hue', h=f'90*floor(t/{scene_length})')
+        .output(path, vcodec='libx264', pix_fmt='yuv420p', g=fps * 2)
+        .run(overwrite_output=True, capture_stdout=True, capture_stderr=True)
+    )
+
+
+def matching_cuts(reference: list, scenes: list, tolerance: float) -> int:
+    cuts = [start for start, _ in scenes[1:]]
+    return sum(any(abs(cut - expected) <= tolerance for cut in cuts) for expected, _ in reference[1:])
+
+
+async def run(args) -> list:
+    results = []
+    config = {**PROFILES[args.profile], 'threshold': None}
+    with tempfile.TemporaryDirectory() as directory:
+        video_path = args.video
+        if not video_path:
+            video_path = os.path.join(directory, 'video.mp4')
+            make_video(video_path, args.duration, args.width, args.height, args.fps, args.scene_length)
+
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max(args.chunks), mp_context=multiprocessing.get_context('spawn')) as pool:
+            async def run_in_pool(func, *func_args):
+                return await loop.run_in_executor(pool, func, *func_args)
+
+            started = time.perf_counter()
+            reference = await run_in_pool(
+                detect_scenes,
+                video_path,
+                config['detector'],
+                config['downscale'],
+                config['frame_skip'],
+                config['threshold'],
+            )
+            sequential_seconds = time.perf_counter() - started
+
+            for chunks in args.chunks:
+                started = time.perf_counter()
+                scenes = await detect_scenes_chunked(run_in_pool, video_path, chunks, args.margin, **config)
+                seconds = time.perf_counter() - started
+                results.append({
+                    'chunks': chunks,
+                    'profile': args.profile,
+                    'seconds': round(seconds, 2),
+                    'sequential_seconds': round(sequential_seconds, 2),
+                    'speedup': round(sequential_seconds / seconds, 2) if seconds else 0.0,
+                    'scenes': len(scenes),
+                    'sequential_scenes': len(reference),
+                    'matching_cuts': matching_cuts(reference, scenes, 1 / args.fps),
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunked scene detection speedup and agreement with one pass")
+    parser.add_argument('--video', default=None, help="Video to use instead of a generated one")
+    parser.add_argument('--duration', type=float, default=1800)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--scene-length', type=float, default=10.0)
+    parser.add_argument('--profile', default='balanced', choices=list(PROFILES))
+    parser.add_argument('--chunks', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--margin', type=float, default=2.0)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
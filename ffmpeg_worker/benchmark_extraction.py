@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import ffmpeg
+
+from frame_extraction import extract_frame, extract_frames
+
+
+def make_video(path: str, duration: float, width: int, height: int, fps: int):
+    (
+        ffmpeg
+        .input(f'testsrc2=size={width}x{height}:rate={fps}:duration={duration}', f='lavfi')
+        .output(path, vcodec='libx264', pix_fmt='yuv420p', g=fps * 2)
+        .run(overwrite_output=True, capture_stdout=True, capture_stderr=True)
+    )
+
+
+def video_duration(path: str) -> float:
+    return float(ffmpeg.probe(path)['format']['duration'])
+
+
+def run(args) -> list:
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        video_path = args.video
+        if not video_path:
+            video_path = os.path.join(directory, 'video.mp4')
+            make_video(video_path, args.duration, args.width, args.height, args.fps)
+        duration = video_duration(video_path)
+
+        for scenes in args.scenes:
+            # Mid points of evenly spaced scenes, the same timestamps the worker asks for
+            length = duration / scenes
+            timestamps = [length * (i + 0.5) for i in range(scenes)]
+            paths = [os.path.join(directory, f'{i}.jpg') for i in range(scenes)]
+
+            started = time.perf_counter()
+            per_scene = [extract_frame(video_path, path, timestamp) for path, timestamp in zip(paths, timestamps)]
+            per_scene_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            single_pass = extract_frames(video_path, paths, timestamps, chunk_size=args.chunk_size)
+            single_pass_seconds = time.perf_counter() - started
+
+            results.append({
+                'duration': round(duration, 1),
+                'scenes': scenes,
+                'chunk_size': args.chunk_size,
+                'per_scene_seconds': round(per_scene_seconds, 2),
+                'per_scene_frames': sum(per_scene),
+                'single_pass_seconds': round(single_pass_seconds, 2),
+                'single_pass_frames': sum(single_pass),
+                'speedup': round(per_scene_seconds / single_pass_seconds, 2) if single_pass_seconds else 0.0,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mid-scene frame extraction: one ffmpeg run per scene vs single pass")
+    parser.add_argument('--video', default=None, help="Video to use instead of a generated one")
+    parser.add_argument('--duration', type=float, default=1800)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--scenes', type=int, nargs='+', default=[50, 200, 500])
+    parser.add_argument('--chunk-size', type=int, default=200)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmark_extraction import make_video, video_duration
+from scene_detection import PROFILES, detect_scenes
+
+
+def run(args) -> list:
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        videos = {path: path for path in args.videos}
+        for resolution in args.resolutions:
+            width, height = (int(value) for value in resolution.lower().split('x'))
+            path = os.path.join(directory, f'{resolution}.mp4')
+            make_video(path, args.duration, width, height, args.fps)
+            videos[resolution] = path
+
+        for name, path in videos.items():
+            duration = video_duration(path)
+            for profile in args.profiles:
+                started = time.perf_counter()
+                scenes = detect_scenes(path, **PROFILES[profile])
+                seconds = time.perf_counter() - started
+                results.append({
+                    'video': name,
+                    'profile': profile,
+                    **PROFILES[profile],
+                    'duration': round(duration, 1),
+                    'scenes': len(scenes),
+                    'seconds': round(seconds, 2),
+                    'realtime_factor': round(duration / seconds, 2) if seconds else 0.0,
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scene detection speed per profile, as a multiple of real time")
+    parser.add_argument('--videos', nargs='*', default=[])
+    parser.add_argument('--resolutions', nargs='*', default=['1920x1080', '3840x2160'])
+    parser.add_argument('--duration', type=float, default=120)
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES))
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
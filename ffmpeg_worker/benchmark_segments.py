@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Task, TaskSegment
+from repositories import TaskRepository, TaskSegmentRepository
+from settings import settings
+
+
+def make_segments(task_id: str, count: int) -> list:
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "task_id": task_id,
+            "start_time": float(i),
+            "end_time": float(i + 1),
+            "status": "queued",
+            "segment_file_url": f"scene-images/{task_id}/scene_{i}.jpg",
+            "created_at": datetime.now(),
+            "updated_at": datetime.now(),
+            "error_message": None,
+        }
+        for i in range(count)
+    ]
+
+
+async def persist(segment_repo: TaskSegmentRepository, mode: str, segments: list):
+    if mode == 'orm':
+        for segment in segments:
+            await segment_repo.create_segment(TaskSegment(**segment))
+    elif mode == 'copy':
+        await segment_repo.copy_segments(segments)
+    else:
+        await segment_repo.create_segments(segments)
+
+
+async def run(args) -> list:
+    engine = create_async_engine(args.database_url, echo=False)
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    task_id = str(uuid.uuid4())
+    results = []
+    try:
+        async with session_factory() as session:
+            await TaskRepository(session).create_task(Task(
+                id=task_id,
+                user_id=None,
+                file_type="video",
+                status="benchmark",
+                created_at=datetime.now(),
+                updated_at=datetime.now(),
+                input_file_url="benchmark",
+                error_message=None,
+            ))
+
+        for count in args.counts:
+            for mode in args.modes:
+                timings = []
+                for _ in range(args.repeats):
+                    segments = make_segments(task_id, count)
+                    async with session_factory() as session:
+                        started = time.perf_counter()
+                        await persist(TaskSegmentRepository(session), mode, segments)
+                        timings.append(time.perf_counter() - started)
+                        await session.execute(delete(TaskSegment).where(TaskSegment.task_id == task_id))
+                        await session.commit()
+                best = min(timings)
+                results.append({
+                    'segments': count,
+                    'mode': mode,
+                    'best_seconds': round(best, 4),
+                    'mean_seconds': round(sum(timings) / len(timings), 4),
+                    'segments_per_sec': round(count / best, 1) if best else 0.0,
+                })
+    finally:
+        async with session_factory() as session:
+            await session.execute(delete(TaskSegment).where(TaskSegment.task_id == task_id))
+            await session.execute(delete(Task).where(Task.id == task_id))
+            await session.commit()
+        await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Segment persistence: one commit per row vs multi-row insert vs COPY")
+    parser.add_argument('--counts', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--modes', nargs='+', default=['orm', 'insert', 'copy'])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--database-url', default=settings.database_url)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
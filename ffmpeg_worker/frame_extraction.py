@@ -0,0 +1,99 @@
+import glob
+import logging
+import os
+import shutil
+import tempfile
+
+import ffmpeg
+
+
+def extract_frame(input_file_path: str, output_image_path: str, timestamp: float, hwaccel: bool = False) -> bool:
+    try:
+        stream = (
+            ffmpeg
+            .input(input_file_path, ss=timestamp)
+            .output(output_image_path, vframes=1)
+        )
+
+        if hwaccel:
+            stream = stream.global_args('-hwaccel', 'cuda')
+
+        stream.run(
+            overwrite_output=True,
+            capture_stdout=True,
+            capture_stderr=True
+        )
+        return True
+    except ffmpeg.Error as e:
+        logging.error(f"Ошибка FFmpeg: {e}")
+        return False
+
+
+def select_expression(timestamps: list) -> str:
+    # The first frame at or after each timestamp, each frame picked at most once
+    return '+'.join(
+        f'gte(t,{timestamp:.6f})*(isnan(prev_selected_t)+lt(prev_selected_t,{timestamp:.6f}))'
+        for timestamp in timestamps
+    )
+
+
+def extract_chunk(input_file_path: str, output_dir: str, timestamps: list, hwaccel: bool) -> list:
+    # Seeking to the first timestamp skips everything before it, frame times restart from zero there
+    offset = timestamps[0]
+    stream = (
+        ffmpeg
+        .input(input_file_path, ss=offset)
+        .filter('select', select_expression([timestamp - offset for timestamp in timestamps]))
+        .output(os.path.join(output_dir, 'frame_%06d.jpg'), vsync='vfr', vframes=len(timestamps))
+    )
+    if hwaccel:
+        stream = stream.global_args('-hwaccel', 'cuda')
+    stream.run(overwrite_output=True, capture_stdout=True, capture_stderr=True)
+    return sorted(glob.glob(os.path.join(output_dir, 'frame_*.jpg')))
+
+
+def extract_frames(
+        input_file_path: str,
+        output_image_paths: list,
+        timestamps: list,
+        hwaccel: bool = False,
+        chunk_size: int = 200,
+) -> list:
+    # One ffmpeg run decodes a whole chunk of sorted timestamps instead of one process per frame
+    order = sorted(range(len(timestamps)), key=lambda i: timestamps[i])
+    extracted = [False] * len(timestamps)
+    for start in range(0, len(order), chunk_size):
+        chunk = order[start:start + chunk_size]
+        output_dir = tempfile.mkdtemp(dir=os.path.dirname(output_image_paths[chunk[0]]) or None)
+        try:
+            frames = extract_chunk(input_file_path, output_dir, [timestamps[i] for i in chunk], hwaccel)
+            if len(frames) == len(chunk):
+                for i, frame in zip(chunk, frames):
+                    os.replace(frame, output_image_paths[i])
+                    extracted[i] = True
+                continue
+            logging.warning(f"Single pass extraction returned {len(frames)} of {len(chunk)} frames, "
+                            f"falling back to one ffmpeg run per frame")
+        except ffmpeg.Error as e:
+            logging.error(f"Ошибка FFmpeg: {e}")
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        for i in chunk:
+            extracted[i] = extract_frame(input_file_path, output_image_paths[i], timestamps[i], hwaccel)
+    return extracted
+
+
+def extract_scene_frames(
+        input_file_path: str,
+        output_image_paths: list,
+        timestamps: list,
+        hwaccel: bool = False,
+        mode: str = 'single_pass',
+        chunk_size: int = 200,
+) -> list:
+    if mode == 'per_scene':
+        return [
+            extract_frame(input_file_path, output_image_path, timestamp, hwaccel)
+            for output_image_path, timestamp in zip(output_image_paths, timestamps)
+        ]
+    return extract_frames(input_file_path, output_image_paths, timestamps, hwaccel, chunk_size)
@@ -0,0 +1,47 @@
+import logging
+
+from s3_utils import get_file_size, get_presigned_url, read_file_range
+
+MAX_TOP_LEVEL_BOXES = 64
+
+
+async def moov_before_mdat(bucket_key: str, size: int) -> bool:
+    # Walks the top-level MP4 boxes with small ranged reads, the payloads are never fetched
+    offset = 0
+    for _ in range(MAX_TOP_LEVEL_BOXES):
+        if offset + 8 > size:
+            break
+        header = await read_file_range(bucket_key, offset, min(offset + 15, size - 1))
+        box_size = int.from_bytes(header[:4], 'big')
+        box_type = header[4:8]
+        if box_size == 1 and len(header) >= 16:
+            box_size = int.from_bytes(header[8:16], 'big')
+        elif box_size == 0:
+            box_size = size - offset
+        if box_type == b'moov':
+            return True
+        if box_type == b'mdat' or box_size < 8:
+            return False
+        offset += box_size
+    return False
+
+
+async def is_streamable(bucket_key: str) -> bool:
+    # MP4 and MOV decode front to back only when the index comes before the media data,
+    # other containers are read sequentially anyway
+    size = await get_file_size(bucket_key)
+    head = await read_file_range(bucket_key, 0, min(15, size - 1))
+    if head[4:8] != b'ftyp':
+        return True
+    return await moov_before_mdat(bucket_key, size)
+
+
+async def streaming_url(bucket_key: str, expires_in: int):
+    try:
+        if not await is_streamable(bucket_key):
+            logging.info(f"{bucket_key} keeps its index at the end, downloading it first")
+            return None
+        return await get_presigned_url(bucket_key, expires_in)
+    except Exception as e:
+        logging.warning(f"Could not open {bucket_key} for streaming, downloading it first: {e}")
+        return None
@@ -0,0 +1,41 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import metrics
+
+
+class VideoProcessPool:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.context = multiprocessing.get_context('spawn')
+        self.executor = self.create_executor(workers)
+
+    def create_executor(self, workers: int):
+        return ProcessPoolExecutor(workers, mp_context=self.context)
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            if self.executor is executor:
+                logging.error("Video process pool broke, starting a new one")
+                metrics.inc('video_pool_restarts')
+                self.executor = self.create_executor(self.workers)
+                executor.shutdown(wait=False)
+
+        # A child killed mid-task, usually by the OOM killer, fails every call running next to it.
+        # Which call killed it is unknown, so each one is retried alone and a repeat crash fails only that call
+        metrics.inc('video_pool_isolated_retries')
+        isolated = self.create_executor(1)
+        try:
+            return await loop.run_in_executor(isolated, func, *args)
+        finally:
+            isolated.shutdown(wait=False)
+
+    async def close(self):
+        await asyncio.to_thread(self.executor.shutdown, cancel_futures=True)
@@ -1,11 +1,27 @@
+import uuid
 from datetime import datetime
 from typing import Optional, List
 
-from sqlalchemy import select
+from sqlalchemy import insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models import Task, TaskSegment
 
+SEGMENT_COLUMNS = [
+    'id',
+    'task_id',
+    'start_time',
+    'end_time',
+    'status',
+    'segment_file_url',
+    'created_at',
+    'updated_at',
+    'error_message',
+]
+
+# asyncpg sends at most this many bind parameters in one statement
+MAX_BIND_PARAMETERS = 32767
+
 
 class TaskRepository:
     def __init__(self, session: AsyncSession):
@@ -39,6 +55,31 @@ class TaskSegmentRepository:
         await self.session.refresh(segment)
         return segment
 
+    async def create_segments(self, segments: list, chunk_size: int = 1000):
+        # Multi-row inserts in one transaction, nothing is read back
+        if segments:
+            chunk_size = max(1, min(chunk_size, MAX_BIND_PARAMETERS // len(segments[0])))
+        for start in range(0, len(segments), chunk_size):
+            await self.session.execute(insert(TaskSegment).values(segments[start:start + chunk_size]))
+        await self.session.commit()
+
+    async def copy_segments(self, segments: list):
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            TaskSegment.__tablename__,
+            records=[
+                (
+                    uuid.UUID(str(segment['id'])),
+                    uuid.UUID(str(segment['task_id'])),
+                    *(segment[column] for column in SEGMENT_COLUMNS[2:]),
+                )
+                for segment in segments
+            ],
+            columns=SEGMENT_COLUMNS,
+        )
+        await self.session.commit()
+
     async def update_segment_status(
         self, segment_id: str, status: str, error_message: str = None
     ):
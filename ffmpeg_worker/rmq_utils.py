@@ -10,6 +10,35 @@ from aio_pika.pool import Pool
 from settings import settings
 
 
+class InFlightLimiter:
+    def __init__(self, func, max_in_flight: int = 0):
+        self.func = func
+        self.max_in_flight = max_in_flight
+        self.semaphore = asyncio.Semaphore(max_in_flight) if max_in_flight else None
+        self.in_flight = 0
+        self.waiting = 0
+
+    async def _call(self, message):
+        self.in_flight += 1
+        try:
+            return await self.func(message)
+        finally:
+            self.in_flight -= 1
+
+    async def __call__(self, message):
+        if self.semaphore is None:
+            return await self._call(message)
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            return await self._call(message)
+        finally:
+            self.semaphore.release()
+
+
 class RMQ:
     def __init__(self):
         self.connection_pool: Pool = Pool(self.get_connection, max_size=5)
@@ -42,10 +71,12 @@ class RMQ:
                 routing_key=query,
             )
 
-    async def consume(self, queue_name: str, func):
+    async def consume(self, queue_name: str, func, prefetch_count: int = 0):
         connection = await self.get_connection()
         async with connection:
             channel = await connection.channel()
+            if prefetch_count:
+                await channel.set_qos(prefetch_count=prefetch_count)
             queue = await channel.declare_queue(queue_name, durable=True, arguments={"x-max-priority": 10})
             await queue.consume(func)
             logging.info(f" [*] Waiting for messages in {queue_name}. To exit press CTRL+C")
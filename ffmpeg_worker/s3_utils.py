@@ -93,3 +93,41 @@ async def download_file_from_s3_to_memory(bucket_key):
         response = await s3_client.get_object(Bucket=settings.MINIO_BUCKET, Key=bucket_key)
         data = await response['Body'].read()
         return data
+
+
+async def get_presigned_url(bucket_key: str, expires_in: int) -> str:
+    async with s3_session.client(
+        "s3",
+        endpoint_url=settings.s3_endpoint,
+        aws_access_key_id=settings.s3_access_key,
+        aws_secret_access_key=settings.s3_secret_key,
+    ) as s3_client:
+        return await s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': settings.s3_bucket, 'Key': bucket_key},
+            ExpiresIn=expires_in,
+        )
+
+
+async def get_file_size(bucket_key: str) -> int:
+    async with s3_session.client(
+        "s3",
+        endpoint_url=settings.s3_endpoint,
+        aws_access_key_id=settings.s3_access_key,
+        aws_secret_access_key=settings.s3_secret_key,
+    ) as s3_client:
+        response = await s3_client.head_object(Bucket=settings.s3_bucket, Key=bucket_key)
+        return response['ContentLength']
+
+
+async def read_file_range(bucket_key: str, start: int, end: int) -> bytes:
+    async with s3_session.client(
+        "s3",
+        endpoint_url=settings.s3_endpoint,
+        aws_access_key_id=settings.s3_access_key,
+        aws_secret_access_key=settings.s3_secret_key,
+    ) as s3_client:
+        response = await s3_client.get_object(
+            Bucket=settings.s3_bucket, Key=bucket_key, Range=f'bytes={start}-{end}'
+        )
+        return await response['Body'].read()
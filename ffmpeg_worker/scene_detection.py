@@ -0,0 +1,209 @@
+import asyncio
+import bisect
+import logging
+
+import ffmpeg
+from scenedetect import (
+    AdaptiveDetector,
+    ContentDetector,
+    HashDetector,
+    HistogramDetector,
+    SceneManager,
+    ThresholdDetector,
+    open_video,
+)
+
+# Detector class, the argument its threshold goes to and the threshold used when none is given
+DETECTORS = {
+    'content': (ContentDetector, 'threshold', 10.0),
+    'adaptive': (AdaptiveDetector, 'adaptive_threshold', 3.0),
+    'histogram': (HistogramDetector, 'threshold', 0.05),
+    'hash': (HashDetector, 'threshold', 0.395),
+    'threshold': (ThresholdDetector, 'threshold', 12.0),
+}
+
+MIN_SCENE_LEN = 15
+
+# downscale 0 lets PySceneDetect pick a factor from the frame width
+PROFILES = {
+    'fast': {'detector': 'hash', 'downscale': 0, 'frame_skip': 2},
+    'balanced': {'detector': 'content', 'downscale': 0, 'frame_skip': 0},
+    'quality': {'detector': 'adaptive', 'downscale': 1, 'frame_skip': 0},
+}
+
+
+def make_detector(name: str, threshold: float = None):
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown scene detector {name}, expected one of {', '.join(DETECTORS)}")
+    detector_class, threshold_arg, default_threshold = DETECTORS[name]
+    return detector_class(
+        **{threshold_arg: default_threshold if threshold is None else threshold},
+        min_scene_len=MIN_SCENE_LEN,
+    )
+
+
+def make_scene_manager(detector: str, downscale: int, threshold: float):
+    scene_manager = SceneManager()
+    if downscale:
+        scene_manager.auto_downscale = False
+        scene_manager.downscale = downscale
+    scene_manager.add_detector(make_detector(detector, threshold))
+    return scene_manager
+
+
+def detect_scenes(
+        input_file_path: str,
+        detector: str = 'content',
+        downscale: int = 0,
+        frame_skip: int = 0,
+        threshold: float = None,
+):
+    video = open_video(input_file_path)
+    scene_manager = make_scene_manager(detector, downscale, threshold)
+    scene_manager.detect_scenes(video, frame_skip=frame_skip)
+    scene_list = scene_manager.get_scene_list()
+    scenes = []
+    for start, end in scene_list:
+        scenes.append((start.get_seconds(), end.get_seconds()))
+
+    if not scenes:
+        duration = video.duration.get_seconds()
+        scenes.append((0.0, duration))
+    else:
+        logging.info(f"Detected {len(scenes)} scenes.")
+    return scenes
+
+
+def detect_cuts_to_queue(
+        cuts,
+        input_file_path: str,
+        detector: str = 'content',
+        downscale: int = 0,
+        frame_skip: int = 0,
+        threshold: float = None,
+):
+    # Puts every cut time on `cuts` as soon as it is found, then None, and returns the duration
+    try:
+        video = open_video(input_file_path)
+        fps = video.frame_rate
+        scene_manager = make_scene_manager(detector, downscale, threshold)
+        scene_manager.detect_scenes(
+            video, frame_skip=frame_skip, callback=lambda frame_img, frame_num: cuts.put(frame_num / fps)
+        )
+        return video.duration.get_seconds()
+    finally:
+        cuts.put(None)
+
+
+def split_targets(duration: float, chunks: int) -> list:
+    return [duration * i / chunks for i in range(1, chunks)]
+
+
+def probe_keyframes(input_file_path: str, chunks: int, window: float):
+    duration = float(ffmpeg.probe(input_file_path)['format']['duration'])
+    # Only keyframes within `window` seconds of the even split points get read, a streamed input
+    # is fetched around the boundaries instead of end to end before detection can start
+    intervals = ','.join(
+        f'{max(0.0, target - window):.3f}%+{2 * window:.3f}' for target in split_targets(duration, chunks)
+    )
+    if not intervals:
+        return [], duration
+    probe = ffmpeg.probe(
+        input_file_path,
+        select_streams='v:0',
+        skip_frame='nokey',
+        read_intervals=intervals,
+        show_entries='frame=pts_time,pkt_pts_time,best_effort_timestamp_time',
+    )
+    keyframes = []
+    for frame in probe.get('frames', []):
+        timestamp = frame.get('pts_time') or frame.get('pkt_pts_time') or frame.get('best_effort_timestamp_time')
+        if timestamp not in (None, 'N/A'):
+            keyframes.append(float(timestamp))
+    return sorted(set(keyframes)), duration
+
+
+def plan_chunks(keyframes: list, duration: float, chunks: int, window: float = None) -> list:
+    # Even split points moved to the nearest keyframe, so every chunk starts on a clean seek
+    bounds = [0.0]
+    for target in split_targets(duration, chunks):
+        position = bisect.bisect_left(keyframes, target)
+        candidates = [
+            keyframe for keyframe in keyframes[max(0, position - 1):position + 1]
+            if window is None or abs(keyframe - target) <= window
+        ]
+        if not candidates:
+            # No keyframe close by, the neighbouring chunks are merged rather than split far off
+            continue
+        nearest = min(candidates, key=lambda keyframe: abs(keyframe - target))
+        if bounds[-1] < nearest < duration:
+            bounds.append(nearest)
+    bounds.append(duration)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def detect_cuts(
+        input_file_path: str,
+        start: float,
+        end: float,
+        margin: float,
+        detector: str = 'content',
+        downscale: int = 0,
+        frame_skip: int = 0,
+        threshold: float = None,
+):
+    # Detection runs `margin` seconds past both edges so cuts near them see the same frames as in one pass,
+    # then keeps only the cuts in [start, end)
+    video = open_video(input_file_path)
+    fps = video.frame_rate
+    start_frame, end_frame, margin_frames = round(start * fps), round(end * fps), round(margin * fps)
+    scene_manager = make_scene_manager(detector, downscale, threshold)
+    video.seek(max(0, start_frame - margin_frames))
+    scene_manager.detect_scenes(video, end_time=end_frame + margin_frames, frame_skip=frame_skip)
+    cuts = [cut.get_frames() for cut in scene_manager.get_cut_list()]
+    return [cut for cut in cuts if start_frame <= cut < end_frame], fps
+
+
+def merge_cuts(chunk_cuts: list, min_gap: int) -> list:
+    # Chunks know nothing of each other's cuts, so the minimum scene length is applied again across edges
+    merged = []
+    for cut in sorted(cut for cuts in chunk_cuts for cut in cuts):
+        if not merged or cut - merged[-1] >= min_gap:
+            merged.append(cut)
+    return merged
+
+
+async def detect_scenes_chunked(
+        run, input_file_path: str, chunks: int, margin: float, keyframe_window: float = 10.0, **config
+):
+    # `run` executes a blocking call in a worker process and awaits it
+    keyframes, duration = await run(probe_keyframes, input_file_path, chunks, keyframe_window)
+    ranges = plan_chunks(keyframes, duration, chunks, keyframe_window)
+    results = await asyncio.gather(*(
+        run(
+            detect_cuts,
+            input_file_path,
+            start,
+            end,
+            margin,
+            config['detector'],
+            config['downscale'],
+            config['frame_skip'],
+            config['threshold'],
+        )
+        for start, end in ranges
+    ))
+    fps = results[0][1]
+    cuts = merge_cuts([cuts for cuts, _ in results], MIN_SCENE_LEN)
+    bounds = [0.0] + [cut / fps for cut in cuts] + [duration]
+    logging.info(f"Detected {len(cuts) + 1} scenes in {len(ranges)} chunks.")
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def probe_video(input_file_path: str):
+    probe = ffmpeg.probe(input_file_path, select_streams='v:0')
+    duration = float(probe['format'].get('duration', 0.0))
+    if not probe['streams']:
+        return 0, 0, duration
+    stream = probe['streams'][0]
+    return int(stream.get('width', 0)), int(stream.get('height', 0)), duration
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+MEGABYTE = 1024 * 1024
+
+
+def available_memory_mb() -> int:
+    # The container limit when there is one, otherwise the node's physical memory
+    try:
+        with open('/sys/fs/cgroup/memory.max', 'r') as f:
+            limit = f.read().strip()
+        if limit != 'max':
+            return int(limit) // MEGABYTE
+    except (OSError, ValueError):
+        pass
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // MEGABYTE
+
+
+class VideoScheduler:
+    # Admits a video once both a decode slot and its share of the memory budget are free
+    def __init__(self, max_videos: int, memory_budget_mb: int):
+        self.max_videos = max(1, max_videos)
+        self.memory_budget_mb = memory_budget_mb
+        self.running = 0
+        self.memory_in_use_mb = 0
+        self.waiting = 0
+        self.condition = asyncio.Condition()
+
+    def fits(self, memory_mb: int) -> bool:
+        if not self.running:
+            return True
+        return self.running < self.max_videos and self.memory_in_use_mb + memory_mb <= self.memory_budget_mb
+
+    @asynccontextmanager
+    async def slot(self, memory_mb: int):
+        async with self.condition:
+            self.waiting += 1
+            try:
+                await self.condition.wait_for(lambda: self.fits(memory_mb))
+            finally:
+                self.waiting -= 1
+            self.running += 1
+            self.memory_in_use_mb += memory_mb
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.running -= 1
+                self.memory_in_use_mb -= memory_mb
+                self.condition.notify_all()
+
+    @classmethod
+    def for_node(cls, max_videos: int, memory_budget_mb: int):
+        max_videos = max_videos or max(1, os.cpu_count() // 2)
+        memory_budget_mb = memory_budget_mb or available_memory_mb() // 2
+        logging.info(f"Video scheduler: up to {max_videos} videos, {memory_budget_mb} MB decode budget")
+        return cls(max_videos, memory_budget_mb)
@@ -1,6 +1,11 @@
+from typing import Literal, Optional
+
 from pydantic import Field, ConfigDict
 from pydantic_settings import BaseSettings
 
+# Nine bind parameters per segment row within the 32767 a statement may carry
+MAX_SEGMENT_INSERT_CHUNK_SIZE = 32767 // 9
+
 
 class Settings(BaseSettings):
     database_url: str = Field(
@@ -35,6 +40,108 @@ class Settings(BaseSettings):
         default='recognition_queue',
         validation_alias='RECOGNITION_QUEUE'
     )
+    video_processing_prefetch_count: int = Field(
+        default=4,
+        validation_alias='VIDEO_PROCESSING_PREFETCH_COUNT'
+    )
+    video_processing_max_in_flight: int = Field(
+        default=4,
+        validation_alias='VIDEO_PROCESSING_MAX_IN_FLIGHT'
+    )
+    video_streaming_enabled: bool = Field(
+        default=True,
+        validation_alias='VIDEO_STREAMING_ENABLED'
+    )
+    video_stream_url_expires: int = Field(
+        default=6 * 3600,
+        validation_alias='VIDEO_STREAM_URL_EXPIRES'
+    )
+    video_process_workers: int = Field(
+        default=0,
+        validation_alias='VIDEO_PROCESS_WORKERS'
+    )
+    max_concurrent_videos: int = Field(
+        default=0,
+        validation_alias='MAX_CONCURRENT_VIDEOS'
+    )
+    video_memory_budget_mb: int = Field(
+        default=0,
+        validation_alias='VIDEO_MEMORY_BUDGET_MB'
+    )
+    video_memory_base_mb: int = Field(
+        default=200,
+        validation_alias='VIDEO_MEMORY_BASE_MB'
+    )
+    video_decode_buffer_frames: int = Field(
+        default=32,
+        validation_alias='VIDEO_DECODE_BUFFER_FRAMES'
+    )
+    scene_profile: Literal['fast', 'balanced', 'quality'] = Field(
+        default='balanced',
+        validation_alias='SCENE_PROFILE'
+    )
+    scene_detector: Optional[Literal['content', 'adaptive', 'histogram', 'hash', 'threshold']] = Field(
+        default=None,
+        validation_alias='SCENE_DETECTOR'
+    )
+    scene_downscale: Optional[int] = Field(
+        default=None,
+        validation_alias='SCENE_DOWNSCALE'
+    )
+    scene_frame_skip: Optional[int] = Field(
+        default=None,
+        validation_alias='SCENE_FRAME_SKIP'
+    )
+    scene_threshold: Optional[float] = Field(
+        default=None,
+        validation_alias='SCENE_THRESHOLD'
+    )
+    scene_chunks: int = Field(
+        default=1,
+        validation_alias='SCENE_CHUNKS'
+    )
+    scene_chunk_min_duration: float = Field(
+        default=300.0,
+        validation_alias='SCENE_CHUNK_MIN_DURATION'
+    )
+    scene_chunk_margin: float = Field(
+        default=2.0,
+        validation_alias='SCENE_CHUNK_MARGIN'
+    )
+    scene_chunk_keyframe_window: float = Field(
+        default=10.0,
+        validation_alias='SCENE_CHUNK_KEYFRAME_WINDOW'
+    )
+    segment_dispatch_mode: Literal['incremental', 'batch'] = Field(
+        default='incremental',
+        validation_alias='SEGMENT_DISPATCH_MODE'
+    )
+    segment_dispatch_concurrency: int = Field(
+        default=8,
+        validation_alias='SEGMENT_DISPATCH_CONCURRENCY'
+    )
+    segment_persist_mode: Literal['insert', 'copy', 'orm'] = Field(
+        default='insert',
+        validation_alias='SEGMENT_PERSIST_MODE'
+    )
+    segment_insert_chunk_size: int = Field(
+        default=1000,
+        ge=1,
+        le=MAX_SEGMENT_INSERT_CHUNK_SIZE,
+        validation_alias='SEGMENT_INSERT_CHUNK_SIZE'
+    )
+    frame_extraction_mode: Literal['single_pass', 'per_scene'] = Field(
+        default='single_pass',
+        validation_alias='FRAME_EXTRACTION_MODE'
+    )
+    frame_extraction_chunk_size: int = Field(
+        default=200,
+        validation_alias='FRAME_EXTRACTION_CHUNK_SIZE'
+    )
+    metrics_report_interval: float = Field(
+        default=60.0,
+        validation_alias='METRICS_REPORT_INTERVAL'
+    )
 
     model_config = ConfigDict(extra="ignore")
 
@@ -0,0 +1,32 @@
+import asyncio
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from process_pool import VideoProcessPool
+
+
+def crash():
+    time.sleep(0.2)
+    os._exit(1)
+
+
+def slow_square(value):
+    time.sleep(1)
+    return value * value
+
+
+def test_repeated_crash_fails_only_the_crashing_call():
+    async def scenario():
+        pool = VideoProcessPool(2)
+        try:
+            outcomes = await asyncio.gather(pool.run(slow_square, 3), pool.run(crash), return_exceptions=True)
+            after = await pool.run(slow_square, 4)
+        finally:
+            await pool.close()
+        return outcomes, after
+
+    (square, crashed), after = asyncio.run(scenario())
+    assert square == 9
+    assert isinstance(crashed, BrokenProcessPool)
+    assert after == 16
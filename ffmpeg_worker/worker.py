@@ -1,24 +1,31 @@
 import asyncio
 import json
 import logging
+import multiprocessing
 import os
+import queue
 import subprocess
 import sys
 import tempfile
+import time
 import traceback
 import uuid
 from datetime import datetime
 
 import aio_pika
-import ffmpeg
-from scenedetect import ContentDetector, SceneManager, open_video
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
+from frame_extraction import extract_scene_frames
+from ingest import streaming_url
 from models import TaskSegment
+from metrics import metrics
+from process_pool import VideoProcessPool
 from repositories import TaskRepository, TaskSegmentRepository
-from rmq_utils import rmq
+from rmq_utils import InFlightLimiter, rmq
 from s3_utils import upload_file_to_s3, download_file_from_s3
+from scene_detection import PROFILES, detect_cuts_to_queue, detect_scenes, detect_scenes_chunked, probe_video
+from scheduler import VideoScheduler
 from settings import settings
 
 
@@ -35,11 +42,207 @@ class FFmpegWorker:
         self.engine = None
         self.AsyncSessionLocal = None
         self.gpu_available = False
+        self.metrics_task = None
+        self.pool = None
+        self.pool_workers = 0
+        self.manager = None
+        self.scheduler = None
 
     async def initialize(self):
         await self.initialize_database()
         await self.check_gpu_availability()
         os.makedirs('tmp', exist_ok=True)
+        # Scene detection and ffmpeg runs block for minutes, so they live in worker processes
+        self.pool_workers = settings.video_process_workers or os.cpu_count()
+        self.pool = VideoProcessPool(self.pool_workers)
+        if settings.segment_dispatch_mode == 'incremental':
+            # Carries cut times out of the pool processes while detection is still running
+            self.manager = multiprocessing.get_context('spawn').Manager()
+        self.scheduler = VideoScheduler.for_node(settings.max_concurrent_videos, settings.video_memory_budget_mb)
+        metrics.register('videos_decoding', lambda: self.scheduler.running)
+        metrics.register('videos_waiting_for_decode', lambda: self.scheduler.waiting)
+        metrics.register('video_memory_in_use_mb', lambda: self.scheduler.memory_in_use_mb)
+        self.metrics_task = asyncio.create_task(metrics.report(settings.metrics_report_interval))
+
+    async def close(self):
+        if self.metrics_task:
+            self.metrics_task.cancel()
+        if self.pool:
+            await self.pool.close()
+        if self.manager:
+            await asyncio.to_thread(self.manager.shutdown)
+        if self.engine:
+            await self.engine.dispose()
+
+    async def run_in_pool(self, func, *args):
+        return await self.pool.run(func, *args)
+
+    def detection_chunks(self, duration: float) -> int:
+        if duration < settings.scene_chunk_min_duration:
+            return 1
+        return max(1, settings.scene_chunks or self.pool_workers)
+
+    async def detect(self, input_file_path: str, chunks: int, scene_config: dict):
+        if chunks > 1:
+            return await detect_scenes_chunked(
+                self.run_in_pool,
+                input_file_path,
+                chunks,
+                settings.scene_chunk_margin,
+                settings.scene_chunk_keyframe_window,
+                **scene_config,
+            )
+        return await self.run_in_pool(
+            detect_scenes,
+            input_file_path,
+            scene_config['detector'],
+            scene_config['downscale'],
+            scene_config['frame_skip'],
+            scene_config['threshold'],
+        )
+
+    async def stream_scenes(self, input_source: str, chunks: int, scene_config: dict):
+        if chunks > 1:
+            for scene in await self.detect(input_source, chunks, scene_config):
+                yield scene
+            return
+        cuts = self.manager.Queue()
+        detection = asyncio.ensure_future(self.run_in_pool(
+            detect_cuts_to_queue,
+            cuts,
+            input_source,
+            scene_config['detector'],
+            scene_config['downscale'],
+            scene_config['frame_skip'],
+            scene_config['threshold'],
+        ))
+        start_time = 0.0
+        while True:
+            try:
+                cut = await asyncio.to_thread(cuts.get, True, 1.0)
+            except queue.Empty:
+                if detection.done():
+                    break
+                continue
+            if cut is None:
+                break
+            if cut <= start_time:
+                # Repeated by a detection retried after the pool broke
+                continue
+            yield start_time, cut
+            start_time = cut
+        yield start_time, await detection
+
+    async def dispatch_segment(
+            self,
+            slots: asyncio.Semaphore,
+            image_file_path: str,
+            recognition_task: dict,
+            timings: dict,
+            started: float
+    ):
+        async with slots:
+            await upload_file_to_s3(image_file_path, recognition_task["image_file_url"])
+            await rmq.post_message(recognition_task, settings.recognition_queue)
+        if 'first_dispatch' not in timings:
+            timings['first_dispatch'] = time.monotonic() - started
+            metrics.observe('stage_first_dispatch', timings['first_dispatch'])
+        try:
+            os.remove(image_file_path)
+        except OSError:
+            pass
+
+    async def segment_incrementally(
+            self,
+            input_source: str,
+            chunks: int,
+            scene_config: dict,
+            task_id: str,
+            image_files_paths: dict,
+            segment_repo,
+            timings: dict,
+            started: float
+    ):
+        # Scenes found while the previous batch was being extracted make up the next batch,
+        # each segment is uploaded and published as soon as its frame exists
+        slots = asyncio.Semaphore(settings.segment_dispatch_concurrency)
+        pending = asyncio.Queue()
+
+        async def produce():
+            async for scene in self.stream_scenes(input_source, chunks, scene_config):
+                pending.put_nowait(scene)
+            pending.put_nowait(None)
+
+        async with asyncio.TaskGroup() as dispatch:
+            dispatch.create_task(produce())
+            finished = False
+            while not finished:
+                scenes = [await pending.get()]
+                while not pending.empty():
+                    scenes.append(pending.get_nowait())
+                if scenes[-1] is None:
+                    finished = True
+                    scenes.pop()
+                if not scenes:
+                    continue
+                recognition_tasks = []
+                batch_paths = {}
+                await self.process_scenes(
+                    scenes=scenes,
+                    recognition_tasks=recognition_tasks,
+                    input_file_path=input_source,
+                    image_files_paths=batch_paths,
+                    segment_repo=segment_repo,
+                    task_id=task_id
+                )
+                image_files_paths.update(batch_paths)
+                for recognition_task in recognition_tasks:
+                    dispatch.create_task(self.dispatch_segment(
+                        slots, batch_paths[recognition_task["image_file_url"]], recognition_task, timings, started
+                    ))
+
+    async def open_input(self, task_id: str, input_file_url: str, timings: dict):
+        # Returns what the decoders read from and the local copy to clean up, if one was made
+        if settings.video_streaming_enabled:
+            url = await self.timed(
+                timings, 'open', streaming_url(input_file_url, settings.video_stream_url_expires)
+            )
+            if url:
+                metrics.inc('videos_streamed')
+                return url, None
+        input_file_path = os.path.join(tempfile.gettempdir(), f"{task_id}.mp4")
+        await self.timed(timings, 'download', download_file_from_s3(input_file_url, input_file_path))
+        metrics.inc('videos_downloaded')
+        return input_file_path, input_file_path
+
+    @staticmethod
+    async def timed(timings: dict, stage: str, coro):
+        started = time.monotonic()
+        try:
+            return await coro
+        finally:
+            timings[stage] = time.monotonic() - started
+            metrics.observe(f'stage_{stage}', timings[stage])
+
+    @staticmethod
+    def scene_detection_config(task_data: dict) -> dict:
+        # Task fields win over settings, settings over the profile
+        profile = task_data.get('scene_profile') or settings.scene_profile
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown scene profile {profile}, expected one of {', '.join(PROFILES)}")
+        config = {**PROFILES[profile], 'threshold': None}
+        for key in config:
+            value = task_data.get(f'scene_{key}')
+            if value is None:
+                value = getattr(settings, f'scene_{key}')
+            if value is not None:
+                config[key] = value
+        return config
+
+    @staticmethod
+    def estimate_memory_mb(width: int, height: int) -> int:
+        frame_mb = width * height * 3 / (1024 * 1024)
+        return int(settings.video_memory_base_mb + frame_mb * settings.video_decode_buffer_frames)
 
     async def initialize_database(self):
         self.engine = create_async_engine(settings.database_url, echo=False)
@@ -72,57 +275,85 @@ class FFmpegWorker:
             recognition_tasks: list,
             segment_repo
     ):
-        for idx, (start_time, end_time) in enumerate(scenes):
-            segment_id = str(uuid.uuid4())
-            image_file_path = os.path.join(
-                tempfile.gettempdir(), f"{segment_id}.jpg"
-            )
-            image_s3_key = f"scene-images/{task_id}/scene_{segment_id}.jpg"
+        segment_ids = [str(uuid.uuid4()) for _ in scenes]
+        image_file_paths = [
+            os.path.join(tempfile.gettempdir(), f"{segment_id}.jpg") for segment_id in segment_ids
+        ]
+        middle_times = [(start_time + end_time) / 2 for start_time, end_time in scenes]
 
-            middle_time = (start_time + end_time) / 2
+        extracted = await self.run_in_pool(
+            extract_scene_frames,
+            input_file_path,
+            image_file_paths,
+            middle_times,
+            self.gpu_available,
+            settings.frame_extraction_mode,
+            settings.frame_extraction_chunk_size,
+        )
+        metrics.inc('frames_extracted', sum(extracted))
+
+        segments = []
+        for (start_time, end_time), segment_id, image_file_path, success in zip(
+                scenes, segment_ids, image_file_paths, extracted
+        ):
+            image_s3_key = f"scene-images/{task_id}/scene_{segment_id}.jpg"
 
-            success = self.extract_frame_from_video(
-                input_file_path, image_file_path, middle_time
-            )
             if not success:
-                await segment_repo.create_segment(
-                    TaskSegment(
-                        id=segment_id,
-                        task_id=task_id,
-                        start_time=start_time,
-                        end_time=end_time,
-                        status="error",
-                        segment_file_url=None,
-                        created_at=datetime.now(),
-                        updated_at=datetime.now(),
-                        error_message="Failed to extract frame",
-                    )
+                segments.append(
+                    {
+                        "id": segment_id,
+                        "task_id": task_id,
+                        "start_time": start_time,
+                        "end_time": end_time,
+                        "status": "error",
+                        "segment_file_url": None,
+                        "created_at": datetime.now(),
+                        "updated_at": datetime.now(),
+                        "error_message": "Failed to extract frame",
+                    }
                 )
                 continue
 
             image_files_paths.update({image_s3_key: image_file_path})
 
-            segment = TaskSegment(
-                id=segment_id,
-                task_id=task_id,
-                start_time=start_time,
-                end_time=end_time,
-                status="queued",
-                segment_file_url=image_s3_key,
-                created_at=datetime.now(),
-                updated_at=datetime.now(),
-                error_message=None,
+            segments.append(
+                {
+                    "id": segment_id,
+                    "task_id": task_id,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "status": "queued",
+                    "segment_file_url": image_s3_key,
+                    "created_at": datetime.now(),
+                    "updated_at": datetime.now(),
+                    "error_message": None,
+                }
             )
-            await segment_repo.create_segment(segment)
 
             recognition_tasks.append(
                 {
                     "segment_id": segment_id,
                     "task_id": task_id,
+                    "file_type": "video",
                     "image_file_url": image_s3_key,
                 }
             )
 
+        # Rows land before any of their recognition messages are published
+        started = time.monotonic()
+        await self.persist_segments(segment_repo, segments)
+        metrics.observe('segment_persist', time.monotonic() - started)
+
+    @staticmethod
+    async def persist_segments(segment_repo, segments: list):
+        if settings.segment_persist_mode == 'copy':
+            await segment_repo.copy_segments(segments)
+        elif settings.segment_persist_mode == 'orm':
+            for segment in segments:
+                await segment_repo.create_segment(TaskSegment(**segment))
+        else:
+            await segment_repo.create_segments(segments, settings.segment_insert_chunk_size)
+
     async def finish_task_processing(
             self,
             image_files_paths: dict,
@@ -151,6 +382,8 @@ class FFmpegWorker:
         image_files_paths = {}
         recognition_tasks = []
         input_file_path = None
+        timings = {}
+        started = time.monotonic()
 
         async with self.AsyncSessionLocal() as session:
             task_repo = TaskRepository(session)
@@ -158,23 +391,47 @@ class FFmpegWorker:
 
             try:
                 await task_repo.update_task_status(task_id, "processing")
-                input_file_path = os.path.join(tempfile.gettempdir(), f"{task_id}.mp4")
-                await download_file_from_s3(input_file_url, input_file_path)
-                scenes = await self.detect_scenes(input_file_path)
-                await self.process_scenes(
-                    scenes=scenes,
-                    recognition_tasks=recognition_tasks,
-                    input_file_path=input_file_path,
-                    image_files_paths=image_files_paths,
-                    segment_repo=segment_repo,
-                    task_id=task_id
-                )
-                await self.finish_task_processing(
-                    task_id=task_id,
-                    image_files_paths=image_files_paths,
-                    recognition_tasks=recognition_tasks,
-                    task_repo=task_repo
-                )
+                scene_config = self.scene_detection_config(task_data)
+                input_source, input_file_path = await self.open_input(task_id, input_file_url, timings)
+                width, height, duration = await self.run_in_pool(probe_video, input_source)
+                chunks = self.detection_chunks(duration)
+                queued_at = time.monotonic()
+                # Every chunk holds its own decoder
+                async with self.scheduler.slot(self.estimate_memory_mb(width, height) * chunks):
+                    timings['queued'] = time.monotonic() - queued_at
+                    metrics.observe('stage_queued', timings['queued'])
+                    if settings.segment_dispatch_mode == 'incremental':
+                        await self.timed(timings, 'segment', self.segment_incrementally(
+                            input_source=input_source,
+                            chunks=chunks,
+                            scene_config=scene_config,
+                            task_id=task_id,
+                            image_files_paths=image_files_paths,
+                            segment_repo=segment_repo,
+                            timings=timings,
+                            started=started
+                        ))
+                    else:
+                        scenes = await self.timed(
+                            timings, 'detect', self.detect(input_source, chunks, scene_config)
+                        )
+                        await self.timed(timings, 'extract', self.process_scenes(
+                            scenes=scenes,
+                            recognition_tasks=recognition_tasks,
+                            input_file_path=input_source,
+                            image_files_paths=image_files_paths,
+                            segment_repo=segment_repo,
+                            task_id=task_id
+                        ))
+                if settings.segment_dispatch_mode == 'incremental':
+                    await task_repo.update_task_status(task_id, "segmented")
+                else:
+                    await self.timed(timings, 'publish', self.finish_task_processing(
+                        task_id=task_id,
+                        image_files_paths=image_files_paths,
+                        recognition_tasks=recognition_tasks,
+                        task_repo=task_repo
+                    ))
             except Exception as e:
                 logging.error(f"process_task exception {traceback.format_exc()}")
                 await task_repo.update_task_status(task_id, "segmentation error")
@@ -186,55 +443,25 @@ class FFmpegWorker:
                         os.remove(image_file_path)
                     except OSError:
                         pass
+                if timings:
+                    logging.info(f"Task {task_id} stage times: "
+                                 f"{', '.join(f'{stage}={seconds:.2f}s' for stage, seconds in timings.items())}")
 
-    @staticmethod
-    async def detect_scenes(input_file_path: str):
-        video = open_video(input_file_path)
-        scene_manager = SceneManager()
-        scene_manager.add_detector(ContentDetector(threshold=10.0))
-        scene_manager.detect_scenes(video)
-        scene_list = scene_manager.get_scene_list()
-        scenes = []
-        for start, end in scene_list:
-            scenes.append((start.get_seconds(), end.get_seconds()))
-
-        if not scenes:
-            duration = video.duration.get_seconds()
-            scenes.append((0.0, duration))
-        else:
-            logging.info(f"Detected {len(scenes)} scenes.")
-        return scenes
-
-    def extract_frame_from_video(
-            self,
-            input_file_path: str,
-            output_image_path: str,
-            timestamp: float
-    ):
-        try:
-            stream = (
-                ffmpeg
-                .input(input_file_path, ss=timestamp)
-                .output(output_image_path, vframes=1)
-            )
-
-            if self.gpu_available:
-                stream = stream.global_args('-hwaccel', 'cuda')
-
-            stream.run(
-                overwrite_output=True,
-                capture_stdout=True,
-                capture_stderr=True
-            )
-            return True
-        except ffmpeg.Error as e:
-            logging.error(f"Ошибка FFmpeg: {e}")
-            return False
 
 async def main():
     worker = FFmpegWorker()
     await worker.initialize()
-    await rmq.consume(settings.video_processing_queue, worker.process_message)
+    handler = InFlightLimiter(worker.process_message, settings.video_processing_max_in_flight)
+    metrics.register('video_processing_in_flight', lambda: handler.in_flight)
+    metrics.register('video_processing_waiting', lambda: handler.waiting)
+    try:
+        await rmq.consume(
+            settings.video_processing_queue,
+            handler,
+            prefetch_count=settings.video_processing_prefetch_count,
+        )
+    finally:
+        await worker.close()
 
 
 if __name__ == "__main__":
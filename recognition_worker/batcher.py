@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+
+
+class InferenceBatcher:
+    def __init__(self, run_batch, max_batch_size: int, max_wait_ms: float, max_concurrent_batches: int = 1):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        # Items are groups of images with their futures, a group is never split between batches
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.carry = None
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self.batch_slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._task = None
+        self._batch_tasks = set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def infer(self, image):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(([image], [future]))
+        return await future
+
+    async def infer_many(self, images: list):
+        # A group no larger than a batch lands in one run, a larger one in as few runs as possible
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in images]
+        for start in range(0, len(images), self.max_batch_size):
+            end = start + self.max_batch_size
+            self.queue.put_nowait((images[start:end], futures[start:end]))
+        return await asyncio.gather(*futures)
+
+    async def _collect(self):
+        groups = [self.carry or await self.queue.get()]
+        self.carry = None
+        size = len(groups[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            try:
+                group = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    group = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if size + len(group[0]) > self.max_batch_size:
+                # The group that does not fit starts the next batch
+                self.carry = group
+                break
+            groups.append(group)
+            size += len(group[0])
+        return [
+            (image, future)
+            for images, futures in groups
+            for image, future in zip(images, futures)
+            if not future.done()
+        ]
+
+    async def _run(self):
+        while True:
+            # Keep collecting while every slot is busy, so batches grow under load
+            await self.batch_slots.acquire()
+            batch = await self._collect()
+            if not batch:
+                self.batch_slots.release()
+                continue
+            task = asyncio.create_task(self._process(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _process(self, batch):
+        images = [image for image, _ in batch]
+        try:
+            results = await self.run_batch(images)
+        except Exception as e:
+            logging.error(f"Batch inference of {len(images)} images failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.batch_slots.release()
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        logging.debug(f"Processed inference batch of {len(images)} images")
@@ -0,0 +1,82 @@
+import argparse
+import json
+import multiprocessing
+import resource
+import time
+
+import cv2
+import numpy as np
+
+from benchmark_utils import write_results
+from decoding import decode_image
+from preprocessing import INPUT_SIZE
+
+RESOLUTIONS = {
+    '12MP': (4000, 3000),
+    '24MP': (6000, 4000),
+    '40MP': (7680, 5200),
+}
+
+
+def make_photo(width: int, height: int) -> bytes:
+    # Smooth gradients with mild noise compress like a photo rather than like random data
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    rng = np.random.default_rng(0)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[..., 0] = (x + y) / 2
+    image[..., 1] = x
+    image[..., 2] = y
+    image = cv2.add(image, rng.integers(0, 16, image.shape, dtype=np.uint8))
+    _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buffer.tobytes()
+
+
+def run_strategy(strategy: str, data: bytes, iterations: int, result_queue):
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    shape = None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        if strategy == 'full':
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        else:
+            image = decode_image(data, INPUT_SIZE)
+        image = cv2.resize(image, (INPUT_SIZE, INPUT_SIZE))
+        timings.append(time.perf_counter() - started)
+        shape = image.shape
+        del image
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result_queue.put({
+        'strategy': strategy,
+        'decode_and_resize_ms': float(np.median(timings) * 1000),
+        'peak_rss_growth_mb': (rss_after - rss_before) / 1024,
+        'output_shape': list(shape),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full vs reduced-resolution JPEG decode of large photos")
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name, (width, height) in RESOLUTIONS.items():
+        data = make_photo(width, height)
+        for strategy in ('full', 'reduced'):
+            # A fresh process per run, so peak RSS is not inherited from the previous one
+            result_queue = context.Queue()
+            process = context.Process(target=run_strategy, args=(strategy, data, args.iterations, result_queue))
+            process.start()
+            result = result_queue.get()
+            process.join()
+            results.append({'resolution': name, 'jpeg_mb': len(data) / 1024 / 1024, **result})
+
+    print(json.dumps(results, indent=2))
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
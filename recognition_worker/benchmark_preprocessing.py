@@ -0,0 +1,81 @@
+import argparse
+import json
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from benchmark_utils import measure, percentiles, synthetic_images, write_results
+from preprocessing import INPUT_SIZE, preprocess_into
+
+
+def legacy_preprocess(images):
+    batch = []
+    for image in images:
+        image_resized = cv2.resize(image, (INPUT_SIZE, INPUT_SIZE))
+        image_data = np.expand_dims(image_resized.astype(np.float32), axis=0)
+        mean = np.array([127.0, 127.0, 127.0])
+        std = np.array([128.0, 128.0, 128.0])
+        image_data = (image_data - mean) / std
+        batch.append(image_data.astype(np.float32))
+    return batch
+
+
+def measure_allocations(func, images) -> dict:
+    func()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    blocks_before = len(tracemalloc.take_snapshot().traces)
+    func()
+    current, peak = tracemalloc.get_traced_memory()
+    blocks_after = len(tracemalloc.take_snapshot().traces)
+    tracemalloc.stop()
+    return {
+        'peak_allocated_bytes_per_image': (peak - baseline) / len(images),
+        'retained_bytes': current - baseline,
+        'retained_blocks': blocks_after - blocks_before,
+    }
+
+
+def benchmark(name, func, images, iterations) -> dict:
+    timings = measure(func, iterations)
+    per_image = [timing / len(images) for timing in timings]
+    return {
+        'name': name,
+        **percentiles(per_image),
+        **measure_allocations(func, images),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocessing time and allocations per image")
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    images = synthetic_images(args.batch_size, args.width, args.height)
+    buffer = np.empty((args.batch_size, INPUT_SIZE, INPUT_SIZE, 3), dtype=np.float32)
+
+    legacy = legacy_preprocess(images)
+    preprocess_into(images, buffer)
+    max_error = float(np.abs(np.concatenate(legacy) - buffer).max())
+
+    results = {
+        'batch_size': args.batch_size,
+        'resolution': f'{args.width}x{args.height}',
+        'max_abs_difference': max_error,
+        'results': [
+            benchmark('legacy', lambda: legacy_preprocess(images), images, args.iterations),
+            benchmark('preallocated', lambda: preprocess_into(images, buffer), images, args.iterations),
+        ],
+    }
+    print(json.dumps(results, indent=2))
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmark_utils import augment_images, load_images, write_results
+from model_utils import make_batch_dynamic
+from onnx_session import create_session
+from preprocessing import preprocess
+from settings import settings
+
+
+def run_model(model_path: str, inputs: np.ndarray, batch_size: int, threads: int):
+    if batch_size > 1:
+        model_path = make_batch_dynamic(model_path)
+    session = create_session(model_path, ['CPUExecutionProvider'], intra_op_threads=threads)
+    input_name = session.get_inputs()[0].name
+    session.run(None, {input_name: inputs[:batch_size]})
+
+    predictions = []
+    timings = []
+    for start in range(0, len(inputs), batch_size):
+        batch = inputs[start:start + batch_size]
+        started = time.perf_counter()
+        predictions.append(session.run(None, {input_name: batch})[0])
+        timings.append(time.perf_counter() - started)
+    return np.concatenate(predictions), len(inputs) / sum(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the INT8 recognition model against fp32")
+    parser.add_argument('--fp32', default=settings.model_path)
+    parser.add_argument('--int8', default=settings.quantized_model_path)
+    parser.add_argument('--images-dir', default='../_samples')
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=0)
+    parser.add_argument('--confidence', type=float, default=0.8)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    images = augment_images(load_images(args.images_dir), args.count)
+    inputs = preprocess(images)
+
+    fp32_predictions, fp32_speed = run_model(args.fp32, inputs, args.batch_size, args.threads)
+    int8_predictions, int8_speed = run_model(args.int8, inputs, args.batch_size, args.threads)
+
+    fp32_top = fp32_predictions.argmax(axis=1)
+    int8_top = int8_predictions.argmax(axis=1)
+    fp32_confidence = fp32_predictions.max(axis=1)
+    int8_confidence = int8_predictions.max(axis=1)
+    # Labels as perform_inference reports them, with -1 standing for 'unknown'
+    fp32_labels = np.where(fp32_confidence > args.confidence, fp32_top, -1)
+    int8_labels = np.where(int8_confidence > args.confidence, int8_top, -1)
+    confident = fp32_confidence > args.confidence
+
+    results = {
+        'images': len(images),
+        'batch_size': args.batch_size,
+        'fp32_images_per_sec': fp32_speed,
+        'int8_images_per_sec': int8_speed,
+        'speedup': int8_speed / fp32_speed,
+        'top1_agreement': float((fp32_top == int8_top).mean()),
+        'top1_agreement_confident': float((fp32_top[confident] == int8_top[confident]).mean()) if confident.any() else None,
+        'reported_label_agreement': float((fp32_labels == int8_labels).mean()),
+        'fp32_above_cutoff': float(confident.mean()),
+        'int8_above_cutoff': float((int8_confidence > args.confidence).mean()),
+        'mean_confidence_delta': float(np.abs(fp32_confidence - int8_confidence).mean()),
+    }
+    print(json.dumps(results, indent=2))
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmark_utils import write_results
+from models import RecognitionResult, Task, TaskSegment
+from repositories import RecognitionResultRepository, TaskSegmentRepository
+from result_writer import BatchedResultWriter
+from settings import settings
+
+
+async def create_segments(session_factory, task_id, count: int) -> list:
+    segment_ids = [uuid.uuid4() for _ in range(count)]
+    async with session_factory() as session:
+        async with session.begin():
+            await session.execute(insert(Task).values(
+                id=task_id,
+                file_type='video',
+                status='benchmark',
+                input_file_url='benchmark',
+                created_at=datetime.now(),
+                updated_at=datetime.now(),
+            ))
+            # Chunks keep each statement under the Postgres limit of 32767 bind parameters
+            for start in range(0, count, 2000):
+                await session.execute(insert(TaskSegment).values([
+                    {
+                        'id': segment_id,
+                        'task_id': task_id,
+                        'status': 'queued',
+                        'created_at': datetime.now(),
+                        'updated_at': datetime.now(),
+                    }
+                    for segment_id in segment_ids[start:start + 2000]
+                ]))
+    return segment_ids
+
+
+def result_row(segment_id) -> dict:
+    return {
+        'id': uuid.uuid4(),
+        'segment_id': segment_id,
+        'object_detected': 'benchmark',
+        'confidence': 0.9,
+        'result_file_url': None,
+        'created_at': datetime.now(),
+    }
+
+
+async def write_one_by_one(session_factory, segment_id, semaphore):
+    async with semaphore:
+        async with session_factory() as session:
+            segment_repo = TaskSegmentRepository(session)
+            await segment_repo.update_segment_status(str(segment_id), 'processing')
+            await RecognitionResultRepository(session).create_result(RecognitionResult(**result_row(segment_id)))
+            await segment_repo.update_segment_status(str(segment_id), 'done')
+
+
+async def write_batched(writer, segment_id):
+    writer.set_status(str(segment_id), 'processing')
+    await writer.write_result(result_row(segment_id))
+
+
+async def run(args):
+    engine = create_async_engine(args.database_url, pool_size=args.concurrency, echo=False)
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    results = []
+    try:
+        for mode in ('per_row', 'batched'):
+            task_id = uuid.uuid4()
+            segment_ids = await create_segments(session_factory, task_id, args.rows)
+            started = time.perf_counter()
+            if mode == 'per_row':
+                semaphore = asyncio.Semaphore(args.concurrency)
+                await asyncio.gather(*(write_one_by_one(session_factory, s, semaphore) for s in segment_ids))
+            else:
+                writer = BatchedResultWriter(session_factory, args.batch_size, args.flush_ms)
+                writer.start()
+                await asyncio.gather(*(write_batched(writer, s) for s in segment_ids))
+                await writer.stop()
+            elapsed = time.perf_counter() - started
+            results.append({'mode': mode, 'rows': args.rows, 'seconds': elapsed, 'rows_per_sec': args.rows / elapsed})
+
+            async with session_factory() as session:
+                async with session.begin():
+                    await session.execute(delete(RecognitionResult).where(RecognitionResult.segment_id.in_(segment_ids)))
+                    await session.execute(delete(TaskSegment).where(TaskSegment.task_id == task_id))
+                    await session.execute(delete(Task).where(Task.id == task_id))
+    finally:
+        await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-row vs batched result persistence against Postgres")
+    parser.add_argument('--database-url', default=settings.database_url)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=settings.result_writer_batch_size)
+    parser.add_argument('--flush-ms', type=float, default=settings.result_writer_flush_ms)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
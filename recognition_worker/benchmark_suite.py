@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from benchmark_utils import load_images, measure, percentiles, synthetic_images, write_results
+from decoding import decode_image
+from onnx_session import create_session, prepare_model
+from preprocessing import INPUT_SIZE, PreprocessingEngine, preprocess_into
+from settings import settings
+from worker import RecognitionWorker
+
+PROVIDERS = ['CPUExecutionProvider']
+
+
+def parse_resolution(value: str):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def build_corpus(args) -> dict:
+    corpus = {}
+    for width, height in map(parse_resolution, args.resolutions):
+        corpus[f'{width}x{height}'] = synthetic_images(args.corpus_size, width, height)
+    if args.images_dir and os.path.isdir(args.images_dir):
+        corpus['samples'] = load_images(args.images_dir)
+    return {
+        name: {'images': images, 'jpegs': [cv2.imencode('.jpg', image)[1].tobytes() for image in images]}
+        for name, images in corpus.items()
+    }
+
+
+def stage_result(stage: str, timings: list, units: int, **params) -> dict:
+    stats = percentiles(timings)
+    return {
+        'stage': stage,
+        **params,
+        **stats,
+        'images_per_sec': units / (stats['mean_ms'] / 1000) if stats['mean_ms'] else 0.0,
+    }
+
+
+def cycle(items: list):
+    position = 0
+
+    def next_item():
+        nonlocal position
+        item = items[position % len(items)]
+        position += 1
+        return item
+    return next_item
+
+
+def benchmark_decode(corpus: dict, iterations: int) -> list:
+    results = []
+    for name, data in corpus.items():
+        next_jpeg = cycle(data['jpegs'])
+        full = measure(lambda: cv2.imdecode(np.frombuffer(next_jpeg(), np.uint8), cv2.IMREAD_COLOR), iterations)
+        reduced = measure(lambda: decode_image(next_jpeg(), INPUT_SIZE), iterations)
+        results.append(stage_result('decode_full', full, 1, resolution=name))
+        results.append(stage_result('decode_reduced', reduced, 1, resolution=name))
+    return results
+
+
+def benchmark_preprocess(corpus: dict, batch_sizes: list, iterations: int) -> list:
+    results = []
+    for name, data in corpus.items():
+        for batch_size in batch_sizes:
+            batch = [data['images'][i % len(data['images'])] for i in range(batch_size)]
+            buffer = np.empty((batch_size, INPUT_SIZE, INPUT_SIZE, 3), dtype=np.float32)
+            timings = measure(lambda: preprocess_into(batch, buffer), iterations)
+            results.append(stage_result('preprocess', timings, batch_size, resolution=name, batch_size=batch_size))
+    return results
+
+
+def benchmark_inference(model_path: str, batch_sizes: list, thread_counts: list, iterations: int) -> list:
+    prepared_model = prepare_model(model_path, PROVIDERS, max(batch_sizes))
+    images = synthetic_images(max(batch_sizes), INPUT_SIZE, INPUT_SIZE)
+    results = []
+    for threads in thread_counts:
+        session = create_session(
+            prepared_model.path, PROVIDERS, intra_op_threads=threads, optimized=prepared_model.optimized
+        )
+        engine = PreprocessingEngine(session)
+        for batch_size in batch_sizes:
+            if batch_size > prepared_model.batch_size:
+                continue
+            buffers = engine.get_buffers(batch_size)
+            preprocess_into(images[:batch_size], buffers.inputs)
+            timings = measure(lambda: session.run_with_iobinding(buffers.binding), iterations, warmup=2)
+            results.append(stage_result('inference', timings, batch_size, batch_size=batch_size, threads=threads))
+    return results
+
+
+def benchmark_annotate(corpus: dict, iterations: int) -> list:
+    results = []
+    for name, data in corpus.items():
+        # The worker annotates the reduced decode whenever it can, so that is what gets drawn on
+        decoded = [decode_image(jpeg, INPUT_SIZE, settings.result_image_max_side) for jpeg in data['jpegs']]
+        next_image = cycle(decoded)
+        annotated = [RecognitionWorker.annotate_image(image, 'label', 0.99) for image in decoded]
+        next_annotated = cycle(annotated)
+        annotate = measure(lambda: RecognitionWorker.annotate_image(next_image(), 'label', 0.99), iterations)
+        encode = measure(lambda: RecognitionWorker.encode_image(next_annotated()), iterations)
+        results.append(stage_result('annotate', annotate, 1, resolution=name))
+        results.append(stage_result('encode', encode, 1, resolution=name))
+    return results
+
+
+def compare(results: list, baseline_path: str, tolerance: float) -> bool:
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+
+    def key(row):
+        return row['stage'], row.get('resolution'), row.get('batch_size'), row.get('threads')
+
+    previous = {key(row): row for row in baseline['results']}
+    regressed = False
+    for row in results:
+        old = previous.get(key(row))
+        if old is None:
+            continue
+        change = row['images_per_sec'] / old['images_per_sec'] - 1 if old['images_per_sec'] else 0.0
+        flag = ''
+        if change < -tolerance:
+            flag = ' REGRESSION'
+            regressed = True
+        print(f"{' '.join(str(part) for part in key(row) if part is not None)}: "
+              f"{old['images_per_sec']:.1f} -> {row['images_per_sec']:.1f} img/s ({change:+.1%}){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline recognition worker benchmark: decode, preprocess, inference, annotate and encode"
+    )
+    parser.add_argument('--model', default=settings.model_path)
+    parser.add_argument('--images-dir', default='../_samples')
+    parser.add_argument('--resolutions', nargs='+', default=['640x480', '1920x1080', '3840x2160'])
+    parser.add_argument('--corpus-size', type=int, default=8)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 16, 32])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--stages', nargs='+', default=['decode', 'preprocess', 'inference', 'annotate'])
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None, help="Earlier output to compare images/sec against")
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args)
+    results = []
+    if 'decode' in args.stages:
+        results += benchmark_decode(corpus, args.iterations)
+    if 'preprocess' in args.stages:
+        results += benchmark_preprocess(corpus, args.batch_sizes, args.iterations)
+    if 'inference' in args.stages:
+        results += benchmark_inference(args.model, args.batch_sizes, args.threads, args.iterations)
+    if 'annotate' in args.stages:
+        results += benchmark_annotate(corpus, args.iterations)
+
+    output = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(),
+        'environment': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'onnxruntime': ort.__version__,
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'model': args.model,
+            'graph_optimization': settings.inference_graph_optimization,
+        },
+        'results': results,
+    }
+    print(json.dumps(output, indent=2))
+    write_results(output, args.output)
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
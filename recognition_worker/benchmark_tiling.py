@@ -0,0 +1,54 @@
+import argparse
+import json
+
+from benchmark_utils import load_images, measure, percentiles, synthetic_images, write_results
+from onnx_session import get_providers, prepare_model
+from preprocessing import PreprocessingEngine
+from settings import settings
+from tiling import make_tiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Photo latency against tile count, batched vs one run per view")
+    parser.add_argument('--model', default=settings.model_path)
+    parser.add_argument('--images-dir', default=None)
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--grids', type=int, nargs='+', default=[1, 2, 3, 4])
+    parser.add_argument('--overlap', type=float, default=settings.tiling_overlap)
+    parser.add_argument('--max-tiles', type=int, default=32)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if args.images_dir:
+        image = load_images(args.images_dir)[0]
+    else:
+        image = synthetic_images(1, args.width, args.height)[0]
+    height, width = image.shape[:2]
+
+    prepared_model = prepare_model(args.model, get_providers(), args.max_tiles + 1)
+    engine = PreprocessingEngine(prepared_model.session)
+
+    results = []
+    for grid in args.grids:
+        tiles = make_tiles(image, grid, args.overlap, args.max_tiles)
+        views = [image, *tiles]
+        row = {'grid': grid, 'tiles': len(tiles)}
+        row['tiling'] = percentiles(
+            measure(lambda: make_tiles(image, grid, args.overlap, args.max_tiles), args.iterations)
+        )
+        if len(views) <= prepared_model.batch_size:
+            row['batched'] = percentiles(measure(lambda: engine.run(views), args.iterations))
+        row['sequential'] = percentiles(
+            measure(lambda: [engine.run([view]) for view in views], args.iterations)
+        )
+        results.append(row)
+
+    output = {'resolution': f'{width}x{height}', 'batch_size': prepared_model.batch_size, 'results': results}
+    print(json.dumps(output, indent=2))
+    write_results(output, args.output)
+
+
+if __name__ == '__main__':
+    main()
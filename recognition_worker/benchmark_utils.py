@@ -0,0 +1,72 @@
+import glob
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def load_images(images_dir: str) -> list:
+    images = []
+    for path in sorted(glob.glob(os.path.join(images_dir, '*'))):
+        if not path.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append(image)
+    if not images:
+        raise ValueError(f"No images found in {images_dir}")
+    return images
+
+
+def augment_images(images: list, count: int) -> list:
+    rng = np.random.default_rng(0)
+    augmented = []
+    while len(augmented) < count:
+        image = images[len(augmented) % len(images)]
+        height, width = image.shape[:2]
+        crop = rng.uniform(0.6, 1.0)
+        crop_height, crop_width = int(height * crop), int(width * crop)
+        top = rng.integers(0, height - crop_height + 1)
+        left = rng.integers(0, width - crop_width + 1)
+        variant = image[top:top + crop_height, left:left + crop_width]
+        if rng.random() < 0.5:
+            variant = cv2.flip(variant, 1)
+        augmented.append(np.ascontiguousarray(variant))
+    return augmented
+
+
+def synthetic_images(count: int, width: int, height: int) -> list:
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def percentiles(timings: list) -> dict:
+    values = np.asarray(timings) * 1000
+    return {
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'mean_ms': float(values.mean()),
+    }
+
+
+def measure(func, iterations: int, warmup: int = 1) -> list:
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def write_results(results, output_path: str):
+    if not output_path:
+        return
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,73 @@
+import time
+
+import numpy as np
+
+from metrics import metrics
+
+
+class Prediction:
+    def __init__(self, scores: np.ndarray, stage: str, embedding: np.ndarray = None):
+        self.scores = scores
+        self.stage = stage
+        self.embedding = embedding
+
+
+def to_predictions(outputs: list, stage: str) -> list:
+    # A second model output, when present, is the penultimate-layer embedding
+    embeddings = outputs[1] if len(outputs) > 1 else [None] * len(outputs[0])
+    return [Prediction(scores, stage, embedding) for scores, embedding in zip(outputs[0], embeddings)]
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class SingleStage:
+    def __init__(self, inference, stage: str = 'full'):
+        self.inference = inference
+        self.stage = stage
+        self.concurrency = inference.concurrency
+
+    async def run(self, images):
+        started = time.monotonic()
+        outputs = await self.inference.run(images)
+        metrics.observe(f'stage_{self.stage}_batch', time.monotonic() - started)
+        metrics.inc(f'stage_{self.stage}_images', len(images))
+        return to_predictions(outputs, self.stage)
+
+    async def close(self):
+        await self.inference.close()
+
+
+class CascadeInference:
+    def __init__(self, fast, full, threshold: float, fast_softmax: bool = True):
+        self.fast = fast
+        self.full = full
+        self.threshold = threshold
+        self.fast_softmax = fast_softmax
+        self.concurrency = fast.concurrency
+
+    async def run(self, images):
+        started = time.monotonic()
+        scores = (await self.fast.run(images))[0]
+        if self.fast_softmax:
+            scores = softmax(scores)
+        metrics.observe('stage_fast_batch', time.monotonic() - started)
+        metrics.inc('stage_fast_images', len(images))
+
+        predictions = [Prediction(row, 'fast') for row in scores]
+        uncertain = np.flatnonzero(scores.max(axis=1) < self.threshold)
+        metrics.inc('cascade_fast_accepted', len(images) - len(uncertain))
+        if len(uncertain):
+            started = time.monotonic()
+            full_outputs = await self.full.run([images[i] for i in uncertain])
+            metrics.observe('stage_full_batch', time.monotonic() - started)
+            metrics.inc('stage_full_images', len(uncertain))
+            for i, prediction in zip(uncertain, to_predictions(full_outputs, 'full')):
+                predictions[i] = prediction
+        return predictions
+
+    async def close(self):
+        await self.fast.close()
+        await self.full.close()
@@ -0,0 +1,56 @@
+import cv2
+import numpy as np
+
+from preprocessing import INPUT_SIZE
+
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Start-of-frame markers carry the image size; DHT, JPG and DAC share the range but do not
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+
+
+def read_jpeg_size(data: bytes):
+    if data[:2] != b'\xff\xd8':
+        return None
+
+    position = 2
+    while position + 9 <= len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            position += 2
+            continue
+        if marker == 0xDA:
+            return None
+        if marker in JPEG_SOF_MARKERS:
+            height = int.from_bytes(data[position + 5:position + 7], 'big')
+            width = int.from_bytes(data[position + 7:position + 9], 'big')
+            return width, height
+        length = int.from_bytes(data[position + 2:position + 4], 'big')
+        position += 2 + length
+    return None
+
+
+def choose_reduction(width: int, height: int, min_side: int, min_long_side: int = 0) -> int:
+    for factor, _ in REDUCED_DECODE_FLAGS:
+        if min(width, height) // factor >= min_side and max(width, height) // factor >= min_long_side:
+            return factor
+    return 1
+
+
+def decode_image(data: bytes, min_side: int = INPUT_SIZE, min_long_side: int = 0):
+    flags = cv2.IMREAD_COLOR
+    size = read_jpeg_size(data)
+    if size is not None:
+        factor = choose_reduction(*size, min_side, min_long_side)
+        flags = dict(REDUCED_DECODE_FLAGS).get(factor, cv2.IMREAD_COLOR)
+    return cv2.imdecode(np.frombuffer(data, np.uint8), flags)
@@ -0,0 +1,295 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import threading
+from multiprocessing import connection, resource_tracker, shared_memory
+
+import numpy as np
+
+from onnx_session import acquire_model, create_session, release_model, warm_up
+from preprocessing import DEFAULT_INPUT_SPEC, InputSpec, PreprocessingEngine, preprocess_into
+
+
+class SharedArray:
+    def __init__(self, shape: tuple, name: str = None):
+        size = int(np.prod(shape)) * np.dtype(np.float32).itemsize
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # The creating process owns the segment, attached processes must not unlink it on exit
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.name = self.shm.name
+        self.array = np.ndarray(shape, dtype=np.float32, buffer=self.shm.buf)
+
+    def close(self, unlink: bool = False):
+        self.array = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class LocalInference:
+    def __init__(self, session, input_spec: InputSpec = DEFAULT_INPUT_SPEC):
+        self.session = session
+        self.engine = PreprocessingEngine(session, input_spec)
+        self.concurrency = 1
+        # Bound buffers are shared, so batches from different lanes take turns
+        self.lock = asyncio.Lock()
+
+    async def start(self, warmup_batch_sizes: list, warmup_runs: int):
+        elapsed = await asyncio.to_thread(warm_up, self.session, warmup_batch_sizes, warmup_runs)
+        logging.info(f"Warmed up batch sizes {warmup_batch_sizes} in {elapsed:.2f}s")
+
+    def _run(self, images):
+        # Bound buffers are reused by the next batch, so callers get their own copy
+        return [outputs.copy() for outputs in self.engine.run(images)]
+
+    async def run(self, images):
+        async with self.lock:
+            return await asyncio.to_thread(self._run, images)
+
+    async def close(self):
+        self.engine = None
+        self.session = None
+
+
+def _bind_slot(session, slot_inputs: np.ndarray, slot_outputs: list):
+    # Inference reads from and writes to the shared slot directly
+    binding = session.io_binding()
+    binding.bind_input(
+        session.get_inputs()[0].name, 'cpu', 0, np.float32, list(slot_inputs.shape), slot_inputs.ctypes.data
+    )
+    for model_output, outputs in zip(session.get_outputs(), slot_outputs):
+        binding.bind_output(
+            model_output.name, 'cpu', 0, np.float32, list(outputs.shape), outputs.ctypes.data
+        )
+    return binding
+
+
+def _pool_worker(model_spec, input_spec, output_specs, warmup, task_queue, result_pipe):
+    model_path, providers, optimized, intra_op_threads = model_spec
+    session = create_session(model_path, providers, intra_op_threads=intra_op_threads, optimized=optimized)
+    inputs = SharedArray(*input_spec)
+    outputs = [SharedArray(*output_spec) for output_spec in output_specs]
+    bindings = {}
+
+    elapsed = warm_up(session, *warmup)
+    result_pipe.send(('ready', elapsed))
+
+    while True:
+        item = task_queue.get()
+        if item is None:
+            break
+        slot, size, sequence = item
+        try:
+            binding = bindings.get((slot, size))
+            if binding is None:
+                binding = _bind_slot(
+                    session, inputs.array[slot, :size], [shared.array[slot, :size] for shared in outputs]
+                )
+                bindings[(slot, size)] = binding
+            session.run_with_iobinding(binding)
+            result_pipe.send((slot, sequence, None))
+        except Exception as e:
+            result_pipe.send((slot, sequence, str(e)))
+
+    bindings.clear()
+    result_pipe.close()
+    inputs.close()
+    for shared in outputs:
+        shared.close()
+
+
+class InferencePool:
+    def __init__(
+            self,
+            prepared_model,
+            providers: list,
+            workers: int,
+            intra_op_threads: int,
+            input_spec: InputSpec = DEFAULT_INPUT_SPEC,
+    ):
+        model_input = prepared_model.session.get_inputs()[0]
+        max_batch_size = prepared_model.batch_size
+        self.model_path = prepared_model.path
+        self.model_spec = (prepared_model.path, providers, prepared_model.optimized, intra_op_threads)
+        # Processes are respawned from this file for as long as the pool runs
+        acquire_model(self.model_path)
+        self.workers = workers
+        self.input_spec = input_spec
+        self.concurrency = workers * 2
+
+        # Ring of slots, each holding one batch of input tensors and its predictions
+        self.inputs = SharedArray((self.concurrency, max_batch_size, *model_input.shape[1:]))
+        self.outputs = [
+            SharedArray((self.concurrency, max_batch_size, *model_output.shape[1:]))
+            for model_output in prepared_model.session.get_outputs()
+        ]
+
+        self.context = multiprocessing.get_context('spawn')
+        # Each process gets its own task queue and result pipe, so a dead one cannot hold a lock the others wait on
+        self.task_queues = []
+        self.result_pipes = []
+        self.processes = []
+        self.free_slots: asyncio.Queue = asyncio.Queue()
+        self.pending = {}
+        self.assigned = {}
+        self.sequence = itertools.count()
+        self.warmup = None
+        self.ready = None
+        self.loop = None
+        self.listener = None
+        self.listening = False
+        self.monitor = None
+        self.closing = False
+
+    async def start(self, warmup_batch_sizes: list, warmup_runs: int):
+        self.loop = asyncio.get_running_loop()
+        self.ready = asyncio.Queue()
+        for slot in range(self.concurrency):
+            self.free_slots.put_nowait(slot)
+        self.warmup = (warmup_batch_sizes, warmup_runs)
+        self.listening = True
+        self.listener = threading.Thread(target=self._listen, daemon=True)
+        self.listener.start()
+
+        for _ in range(self.workers):
+            self.task_queues.append(self.context.Queue())
+            process, result_pipe = self._spawn(self.task_queues[-1])
+            self.processes.append(process)
+            self.result_pipes.append(result_pipe)
+
+        # Every process loads and warms up its own session before the pool accepts batches
+        for _ in self.processes:
+            elapsed = await self.wait_ready()
+            logging.debug(f"Inference process warmed up batch sizes {warmup_batch_sizes} in {elapsed:.2f}s")
+        self.monitor = asyncio.create_task(self._watch())
+        logging.info(f"Started inference pool with {self.workers} processes for {self.model_path}")
+
+    def _spawn(self, task_queue):
+        reader, writer = self.context.Pipe(duplex=False)
+        process = self.context.Process(
+            target=_pool_worker,
+            args=(
+                self.model_spec,
+                (self.inputs.array.shape, self.inputs.name),
+                [(shared.array.shape, shared.name) for shared in self.outputs],
+                self.warmup,
+                task_queue,
+                writer,
+            ),
+            daemon=True,
+        )
+        process.start()
+        # The reader sees EOF once the process exits only if no other copy of the writer is open
+        writer.close()
+        return process, reader
+
+    async def _watch(self):
+        while not self.closing:
+            await asyncio.sleep(1)
+            for index, process in enumerate(self.processes):
+                if process.is_alive() or self.closing:
+                    continue
+                logging.error(f"Inference process {process.pid} exited with code {process.exitcode}, restarting it")
+                # Batches it held will never come back, their callers get an error instead of waiting forever
+                for slot in [slot for slot, owner in self.assigned.items() if owner == index]:
+                    self._fail(slot, RuntimeError(f"Inference process exited with code {process.exitcode}"))
+                self.task_queues[index] = self.context.Queue()
+                self.processes[index], self.result_pipes[index] = self._spawn(self.task_queues[index])
+
+    async def wait_ready(self):
+        while True:
+            try:
+                return await asyncio.wait_for(self.ready.get(), timeout=1)
+            except asyncio.TimeoutError:
+                if not all(process.is_alive() for process in self.processes):
+                    raise RuntimeError("Inference process exited during startup")
+
+    def _listen(self):
+        finished = set()
+        while self.listening:
+            # Pipes of respawned processes show up on the next pass
+            readers = [reader for reader in self.result_pipes if reader not in finished]
+            finished.intersection_update(self.result_pipes)
+            for reader in connection.wait(readers, timeout=0.5):
+                try:
+                    item = reader.recv()
+                except (EOFError, OSError):
+                    # Its process is gone, _watch fails the batches it held and replaces it
+                    finished.add(reader)
+                    reader.close()
+                    continue
+                if item[0] == 'ready':
+                    self.loop.call_soon_threadsafe(self.ready.put_nowait, item[1])
+                else:
+                    self.loop.call_soon_threadsafe(self._resolve, *item)
+        for reader in self.result_pipes:
+            reader.close()
+
+    def _release(self, slot):
+        self.pending.pop(slot)
+        self.assigned.pop(slot)
+        # The slot is reusable only once its process is done with it, even if the caller went away
+        self.free_slots.put_nowait(slot)
+
+    def _resolve(self, slot, sequence, error):
+        # A result of a batch already failed because its process died belongs to no one
+        if slot not in self.pending or self.pending[slot][2] != sequence:
+            return
+        future, size, _ = self.pending[slot]
+        if not future.done():
+            if error is None:
+                future.set_result([shared.array[slot, :size].copy() for shared in self.outputs])
+            else:
+                future.set_exception(RuntimeError(error))
+        self._release(slot)
+
+    def _fail(self, slot, error: Exception):
+        future = self.pending[slot][0]
+        if not future.done():
+            future.set_exception(error)
+        self._release(slot)
+
+    def _fill(self, slot, images):
+        preprocess_into(images, self.inputs.array[slot, :len(images)], self.input_spec)
+
+    async def run(self, images):
+        slot = await self.free_slots.get()
+        try:
+            await asyncio.to_thread(self._fill, slot, images)
+        except BaseException:
+            self.free_slots.put_nowait(slot)
+            raise
+
+        future = self.loop.create_future()
+        sequence = next(self.sequence)
+        # The least busy process takes the batch
+        loads = [0] * len(self.processes)
+        for index in self.assigned.values():
+            loads[index] += 1
+        index = loads.index(min(loads))
+        self.pending[slot] = (future, len(images), sequence)
+        self.assigned[slot] = index
+        self.task_queues[index].put((slot, len(images), sequence))
+        return await future
+
+    async def close(self):
+        self.closing = True
+        if self.monitor:
+            self.monitor.cancel()
+        for task_queue in self.task_queues:
+            task_queue.put(None)
+        for process in self.processes:
+            await asyncio.to_thread(process.join, 10)
+            if process.is_alive():
+                process.terminate()
+        self.listening = False
+        if self.listener:
+            await asyncio.to_thread(self.listener.join)
+        self.inputs.close(unlink=True)
+        for shared in self.outputs:
+            shared.close(unlink=True)
+        release_model(self.model_path)
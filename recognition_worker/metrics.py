@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from collections import defaultdict, deque
+
+RECENT_SAMPLES = 1000
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.callbacks = {}
+        self.timings = defaultdict(lambda: [0, 0.0])
+        self.recent = defaultdict(lambda: deque(maxlen=RECENT_SAMPLES))
+
+    def inc(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def set(self, name: str, value):
+        self.gauges[name] = value
+
+    def observe(self, name: str, seconds: float):
+        timing = self.timings[name]
+        timing[0] += 1
+        timing[1] += seconds
+        self.recent[name].append(seconds)
+
+    def percentile(self, name: str, q: float) -> float:
+        samples = sorted(self.recent[name])
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+    def register(self, name: str, callback):
+        self.callbacks[name] = callback
+
+    def snapshot(self) -> dict:
+        return {
+            **self.counters,
+            **self.gauges,
+            **{name: callback() for name, callback in self.callbacks.items()},
+            **{
+                f'{name}_avg_ms': round(total / count * 1000, 2)
+                for name, (count, total) in self.timings.items() if count
+            },
+            **{
+                f'{name}_p99_ms': round(self.percentile(name, 0.99) * 1000, 2)
+                for name, samples in self.recent.items() if samples
+            },
+        }
+
+    async def report(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            values = ', '.join(f'{name}={value}' for name, value in sorted(self.snapshot().items()))
+            logging.info(f"Metrics: {values}")
+
+
+metrics = Metrics()
@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import json
+import os
+
+from scores import build_label_table
+from settings import settings
+
+ACTIVE_FILE = 'active'
+MANIFEST_FILE = 'manifest.json'
+
+
+class ModelEntry:
+    def __init__(self, version, model_path: str, labels_path: str):
+        self.version = version
+        self.model_path = model_path
+        self.labels_path = labels_path
+
+
+class ModelRegistry:
+    # One subdirectory per version with the model and its label map, the `active` file names the live one
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def versions(self) -> list:
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if os.path.isdir(os.path.join(self.directory, name))
+        )
+
+    def get(self, version: str) -> ModelEntry:
+        version_dir = os.path.join(self.directory, version)
+        manifest = {'model': 'model.onnx', 'labels': 'labels_map.txt'}
+        manifest_path = os.path.join(version_dir, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                manifest.update(json.load(f))
+        entry = ModelEntry(
+            version,
+            os.path.join(version_dir, manifest['model']),
+            os.path.join(version_dir, manifest['labels']),
+        )
+        for path in (entry.model_path, entry.labels_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Model version {version} has no {os.path.basename(path)}")
+        return entry
+
+    def active_version(self) -> str:
+        active_path = os.path.join(self.directory, ACTIVE_FILE)
+        if os.path.exists(active_path):
+            with open(active_path, 'r') as f:
+                return f.read().strip()
+        versions = self.versions()
+        if not versions:
+            raise FileNotFoundError(f"No model versions in {self.directory}")
+        return versions[-1]
+
+    def active(self) -> ModelEntry:
+        return self.get(self.active_version())
+
+    def promote(self, version: str):
+        self.get(version)
+        tmp_path = os.path.join(self.directory, f'{ACTIVE_FILE}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.directory, ACTIVE_FILE))
+
+
+class LoadedModel:
+    def __init__(self, version: str, inference, batchers: dict, labels: dict, result_cache):
+        self.version = version
+        self.inference = inference
+        self.batchers = batchers
+        self.labels = labels
+        self.label_table = build_label_table(labels)
+        self.result_cache = result_cache
+        self.active_jobs = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def acquire(self):
+        self.active_jobs += 1
+        self.idle.clear()
+        return self
+
+    def release(self):
+        self.active_jobs -= 1
+        if not self.active_jobs:
+            self.idle.set()
+
+    async def close(self):
+        # Jobs that picked this model before a switch finish on it first
+        await self.idle.wait()
+        for batcher in self.batchers.values():
+            await batcher.stop()
+        await self.inference.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List model versions or switch the active one")
+    parser.add_argument('command', choices=['list', 'promote'])
+    parser.add_argument('version', nargs='?')
+    parser.add_argument('--registry-dir', default=settings.model_registry_dir)
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry_dir)
+    if args.command == 'promote':
+        if not args.version:
+            parser.error("promote needs a version")
+        registry.promote(args.version)
+    active = registry.active_version()
+    for version in registry.versions():
+        print(f"{'*' if version == active else ' '} {version}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import hashlib
+import logging
+import os
+
+import onnx
+
+
+def is_fresh(derived_path: str, source_path: str) -> bool:
+    # Derived models are rewritten only when their source changed, so their content and mtime stay stable
+    return os.path.exists(derived_path) and os.path.getmtime(derived_path) >= os.path.getmtime(source_path)
+
+
+def make_batch_dynamic(model_path: str) -> str:
+    root, ext = os.path.splitext(model_path)
+    dynamic_model_path = f'{root}.dynamic{ext}'
+    if is_fresh(dynamic_model_path, model_path):
+        return dynamic_model_path
+
+    model = onnx.load(model_path)
+    tensors = list(model.graph.input) + list(model.graph.output)
+    if all(not tensor.type.tensor_type.shape.dim[0].HasField('dim_value') for tensor in tensors):
+        return model_path
+
+    for tensor in tensors:
+        tensor.type.tensor_type.shape.dim[0].dim_param = 'batch'
+    # Inferred intermediate shapes still carry the old batch size
+    del model.graph.value_info[:]
+
+    onnx.save(model, dynamic_model_path)
+    logging.info(f"Saved dynamic batch model to {dynamic_model_path}")
+    return dynamic_model_path
+
+
+def find_embedding_tensor(model) -> str:
+    # Walk back from the class scores through the classifier head to the pooled features
+    producers = {output: node for node in model.graph.node for output in node.output}
+    node = producers.get(model.graph.output[0].name)
+    while node is not None:
+        if node.op_type in ('MatMul', 'Gemm'):
+            return node.input[0]
+        if node.op_type not in ('Softmax', 'Add', 'Identity', 'Reshape', 'Flatten'):
+            break
+        node = producers.get(node.input[0])
+    raise ValueError("Could not find the classifier layer input")
+
+
+def add_embedding_output(model_path: str, tensor_name: str = '') -> str:
+    root, ext = os.path.splitext(model_path)
+    embedding_model_path = f'{root}.embedding{ext}'
+    if is_fresh(embedding_model_path, model_path):
+        existing = onnx.load(embedding_model_path)
+        if not tensor_name or any(output.name == tensor_name for output in existing.graph.output):
+            return embedding_model_path
+
+    model = onnx.load(model_path)
+    tensor_name = tensor_name or find_embedding_tensor(model)
+    if any(output.name == tensor_name for output in model.graph.output):
+        return model_path
+
+    inferred = onnx.shape_inference.infer_shapes(model)
+    value_info = next((info for info in inferred.graph.value_info if info.name == tensor_name), None)
+    if value_info is None:
+        raise ValueError(f"Could not infer the shape of {tensor_name}")
+    dims = value_info.type.tensor_type.shape.dim
+    if len(dims) != 2 or not dims[1].HasField('dim_value'):
+        raise ValueError(f"Embedding tensor {tensor_name} must be 2D with a fixed size")
+    batch_dim = model.graph.output[0].type.tensor_type.shape.dim[0]
+    batch = batch_dim.dim_param if batch_dim.HasField('dim_param') else batch_dim.dim_value
+    model.graph.output.append(
+        onnx.helper.make_tensor_value_info(tensor_name, onnx.TensorProto.FLOAT, [batch, dims[1].dim_value])
+    )
+
+    onnx.save(model, embedding_model_path)
+    logging.info(f"Saved model with embedding output {tensor_name} to {embedding_model_path}")
+    return embedding_model_path
+
+
+def get_content_hash(model_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def get_model_version(model_path: str) -> str:
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    return f'{name}:{get_content_hash(model_path)}'
@@ -7,7 +7,7 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
-    Text, Integer,
+    Text, Integer, PrimaryKeyConstraint, LargeBinary, Index,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import DeclarativeBase
@@ -70,13 +70,34 @@ class RecognitionResult(Base):
     object_detected = Column(String, nullable=False)
     confidence = Column(Float, nullable=False)
     result_file_url = Column(String, nullable=True)
+    model_stage = Column(String, nullable=True)
+    model_version = Column(String, nullable=True)
+    scores = Column(LargeBinary, nullable=True)
+    embedding = Column(LargeBinary, nullable=True)
     created_at = Column(DateTime, default=datetime.now())
 
     segment = relationship("TaskSegment", back_populates="recognition_results")
 
+    __table_args__ = (Index('ix_recognition_results_created_at_id', 'created_at', 'id'),)
+
 
 class Label(Base):
     __tablename__ = 'labels_map'
 
     id = Column(Integer, primary_key=True)
     label = Column(String, nullable=False)
+
+
+class RecognitionCacheEntry(Base):
+    __tablename__ = 'recognition_cache'
+
+    image_hash = Column(String, nullable=False)
+    model_version = Column(String, nullable=False)
+    object_detected = Column(String, nullable=False)
+    confidence = Column(Float, nullable=False)
+    result_file_url = Column(String, nullable=True)
+    scores = Column(LargeBinary, nullable=True)
+    embedding = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=datetime.now())
+
+    __table_args__ = (PrimaryKeyConstraint('image_hash', 'model_version'),)
@@ -0,0 +1,175 @@
+import glob
+import hashlib
+import logging
+import os
+import time
+from collections import Counter
+
+import numpy as np
+import onnxruntime as ort
+
+from model_utils import add_embedding_output, get_content_hash, make_batch_dynamic
+from settings import settings
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disabled': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    'sequential': ort.ExecutionMode.ORT_SEQUENTIAL,
+    'parallel': ort.ExecutionMode.ORT_PARALLEL,
+}
+
+# Optimized models that live inference pools start their processes from, pruning never removes them
+models_in_use = Counter()
+
+
+class PreparedModel:
+    def __init__(self, session, path: str, batch_size: int, optimized: bool):
+        self.session = session
+        self.path = path
+        self.batch_size = batch_size
+        self.optimized = optimized
+
+
+def get_providers():
+    if 'CUDAExecutionProvider' in ort.get_available_providers():
+        return ['CUDAExecutionProvider']
+    return ['CPUExecutionProvider']
+
+
+def create_session_options(intra_op_threads: int = None, optimized: bool = False):
+    sess_options = ort.SessionOptions()
+    if intra_op_threads is None:
+        intra_op_threads = settings.inference_intra_op_threads
+    sess_options.intra_op_num_threads = intra_op_threads
+    sess_options.inter_op_num_threads = settings.inference_inter_op_threads
+    sess_options.execution_mode = EXECUTION_MODES[settings.inference_execution_mode]
+    # An already optimized graph is loaded as is instead of being optimized again
+    if optimized:
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    else:
+        sess_options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[settings.inference_graph_optimization]
+    return sess_options
+
+
+def create_session(model_path: str, providers: list, intra_op_threads: int = None, optimized: bool = False):
+    sess_options = create_session_options(intra_op_threads, optimized)
+    return ort.InferenceSession(model_path, sess_options=sess_options, providers=providers)
+
+
+def get_source_name(model_path: str) -> str:
+    # Registry versions all name their file model.onnx, the source directory tells them apart
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    source_dir = os.path.dirname(os.path.abspath(model_path))
+    return f'{name}-{hashlib.sha256(source_dir.encode()).hexdigest()[:8]}'
+
+
+def get_optimized_model_path(model_path: str, providers: list) -> str:
+    # Keyed by content, so restarts hit the cache and a changed source gets a new file
+    key = f'{settings.inference_graph_optimization}.{providers[0]}.ort-{ort.__version__}.{get_content_hash(model_path)}'
+    return os.path.join(settings.optimized_model_dir, f'{get_source_name(model_path)}--{key}.onnx')
+
+
+def acquire_model(path: str):
+    models_in_use[path] += 1
+
+
+def release_model(path: str):
+    models_in_use[path] -= 1
+    if models_in_use[path] <= 0:
+        del models_in_use[path]
+
+
+def prune_optimized_models(model_path: str, optimized_model_path: str):
+    # Only earlier optimizations of the same source file, never one a running pool still respawns from
+    pattern = os.path.join(settings.optimized_model_dir, f'{get_source_name(model_path)}--*.onnx')
+    for path in glob.glob(pattern):
+        if path == optimized_model_path or path in models_in_use:
+            continue
+        try:
+            os.remove(path)
+            logging.info(f"Removed stale optimized model {path}")
+        except OSError:
+            pass
+
+
+def load_optimized_session(model_path: str, providers: list):
+    if not settings.cache_optimized_model or settings.inference_graph_optimization == 'disabled':
+        return create_session(model_path, providers), model_path, False
+
+    optimized_model_path = get_optimized_model_path(model_path, providers)
+    if os.path.exists(optimized_model_path):
+        logging.info(f"Using cached optimized model {optimized_model_path}")
+        return create_session(optimized_model_path, providers, optimized=True), optimized_model_path, True
+
+    os.makedirs(settings.optimized_model_dir, exist_ok=True)
+    tmp_path = f'{optimized_model_path}.{os.getpid()}.tmp'
+    sess_options = create_session_options()
+    sess_options.optimized_model_filepath = tmp_path
+    try:
+        session = ort.InferenceSession(model_path, sess_options=sess_options, providers=providers)
+        os.replace(tmp_path, optimized_model_path)
+    except Exception as e:
+        logging.warning(f"Could not persist optimized model for {model_path}: {e}")
+        return create_session(model_path, providers), model_path, False
+
+    logging.info(f"Saved optimized model to {optimized_model_path}")
+    prune_optimized_models(model_path, optimized_model_path)
+    return session, optimized_model_path, True
+
+
+def check_batch_support(session):
+    model_input = session.get_inputs()[0]
+    dummy = np.zeros((2, *model_input.shape[1:]), dtype=np.float32)
+    predictions = session.run(None, {model_input.name: dummy})[0]
+    if predictions.shape[0] != 2:
+        raise ValueError(f"unexpected output shape {predictions.shape}")
+
+
+def with_embedding_output(model_path: str) -> str:
+    try:
+        return add_embedding_output(model_path, settings.embedding_output_name)
+    except Exception as e:
+        logging.warning(f"Could not expose embeddings of {model_path}: {e}")
+        return model_path
+
+
+def prepare_model(model_path: str, providers: list, batch_size: int, embeddings: bool = False) -> PreparedModel:
+    if batch_size > 1:
+        try:
+            dynamic_model_path = make_batch_dynamic(model_path)
+            if embeddings:
+                dynamic_model_path = with_embedding_output(dynamic_model_path)
+            session, path, optimized = load_optimized_session(dynamic_model_path, providers)
+            check_batch_support(session)
+            return PreparedModel(session, path, batch_size, optimized)
+        except Exception as e:
+            logging.warning(f"Model {model_path} does not support batched inference, falling back to batch size 1: {e}")
+
+    if embeddings:
+        model_path = with_embedding_output(model_path)
+    session, path, optimized = load_optimized_session(model_path, providers)
+    return PreparedModel(session, path, 1, optimized)
+
+
+def get_warmup_batch_sizes(batch_size: int) -> list:
+    sizes = {1, batch_size}
+    size = 2
+    while size < batch_size:
+        sizes.add(size)
+        size *= 2
+    return sorted(sizes)
+
+
+def warm_up(session, batch_sizes: list, runs: int):
+    model_input = session.get_inputs()[0]
+    started = time.monotonic()
+    for batch_size in batch_sizes:
+        dummy = np.zeros((batch_size, *model_input.shape[1:]), dtype=np.float32)
+        for _ in range(runs):
+            session.run(None, {model_input.name: dummy})
+    return time.monotonic() - started
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+
+from metrics import metrics
+
+
+class RecognitionJob:
+    def __init__(self, task_data: dict, lane: str = 'video'):
+        self.lane = lane
+        self.segment_id = task_data['segment_id']
+        self.task_id = task_data['task_id']
+        self.image_file_url = task_data.get('image_file_url')
+        self.file_type = task_data.get('file_type')
+        self.tiled = False
+        self.image_data = None
+        self.image_hash = None
+        self.image = None
+        self.cached = None
+        self.object_detected = None
+        self.confidence = None
+        self.scores = None
+        self.embedding = None
+        self.result_file_url = None
+        self.model_stage = None
+        self.model = None
+        self.model_version = None
+        self.extra_results = []
+        self.future = None
+
+
+class Pipeline:
+    def __init__(self, stages: list, queue_size: int, on_error, name: str = ''):
+        self.name = name
+        self.stages = stages
+        self.queues = [asyncio.Queue(maxsize=queue_size) for _ in stages]
+        self.on_error = on_error
+        self.tasks = []
+
+    def start(self):
+        for index, (name, _, concurrency) in enumerate(self.stages):
+            for _ in range(concurrency):
+                self.tasks.append(asyncio.create_task(self._stage_worker(index)))
+            logging.info(f"Pipeline {self.name} stage {name} started with concurrency {concurrency}")
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def submit(self, job: RecognitionJob):
+        job.future = asyncio.get_running_loop().create_future()
+        await self.queues[0].put(job)
+        return await job.future
+
+    async def _fail(self, job: RecognitionJob, error: Exception):
+        try:
+            await self.on_error(job, error)
+        except Exception as e:
+            # Nothing was persisted for the job, so its message has to be redelivered
+            logging.error(f"Error handler failed for segment {job.segment_id}: {e}")
+            if not job.future.done():
+                job.future.set_exception(e)
+            return
+        if not job.future.done():
+            job.future.set_result(job)
+
+    async def _stage_worker(self, index: int):
+        name, handler, _ = self.stages[index]
+        queue = self.queues[index]
+        gauge = f'pipeline_{self.name}_{name}_queued' if self.name else f'pipeline_{name}_queued'
+        while True:
+            job = await queue.get()
+            metrics.set(gauge, queue.qsize())
+            try:
+                await handler(job)
+            except Exception as e:
+                await self._fail(job, e)
+                continue
+
+            if index + 1 < len(self.stages):
+                await self.queues[index + 1].put(job)
+            elif not job.future.done():
+                job.future.set_result(job)
@@ -0,0 +1,98 @@
+import threading
+
+import cv2
+import numpy as np
+
+INPUT_SIZE = 224
+
+
+class InputSpec:
+    def __init__(self, layout: str = 'nhwc', mean=(127.0, 127.0, 127.0), std=(128.0, 128.0, 128.0), rgb: bool = False):
+        self.layout = layout
+        # (x - mean) / std folded into a single float32 multiply-add per channel
+        self.scale = (1 / np.asarray(std, dtype=np.float64)).astype(np.float32)
+        self.offset = (-np.asarray(mean, dtype=np.float64) / np.asarray(std, dtype=np.float64)).astype(np.float32)
+        self.rgb = rgb
+
+    def input_size(self, shape: tuple):
+        if self.layout == 'nchw':
+            return shape[-1], shape[-2]
+        return shape[-2], shape[-3]
+
+
+DEFAULT_INPUT_SPEC = InputSpec()
+
+_staging = threading.local()
+
+
+def _get_staging(height: int, width: int):
+    staging = getattr(_staging, 'buffer', None)
+    if staging is None or staging.shape != (height, width, 3):
+        staging = np.empty((height, width, 3), dtype=np.uint8)
+        _staging.buffer = staging
+    return staging
+
+
+def preprocess_into(images, out: np.ndarray, spec: InputSpec = DEFAULT_INPUT_SPEC):
+    width, height = spec.input_size(out.shape)
+    staging = _get_staging(height, width)
+    # Decoded images are BGR, a reversed view feeds RGB models without a copy
+    source = staging[..., ::-1] if spec.rgb else staging
+    for image, target in zip(images, out):
+        cv2.resize(image, (width, height), dst=staging)
+        if spec.layout == 'nchw':
+            for channel in range(3):
+                np.multiply(source[..., channel], spec.scale[channel], out=target[channel])
+                np.add(target[channel], spec.offset[channel], out=target[channel])
+        else:
+            np.multiply(source, spec.scale, out=target)
+            np.add(target, spec.offset, out=target)
+    return out
+
+
+def preprocess(images, input_size: int = INPUT_SIZE, spec: InputSpec = DEFAULT_INPUT_SPEC):
+    if spec.layout == 'nchw':
+        shape = (len(images), 3, input_size, input_size)
+    else:
+        shape = (len(images), input_size, input_size, 3)
+    return preprocess_into(images, np.empty(shape, dtype=np.float32), spec)
+
+
+class BoundBuffers:
+    def __init__(self, session, input_shape: tuple, output_shapes: list):
+        self.inputs = np.empty(input_shape, dtype=np.float32)
+        self.outputs = [np.empty((input_shape[0], *shape), dtype=np.float32) for shape in output_shapes]
+        self.binding = session.io_binding()
+        self.binding.bind_input(
+            session.get_inputs()[0].name, 'cpu', 0, np.float32, list(input_shape), self.inputs.ctypes.data
+        )
+        for model_output, outputs in zip(session.get_outputs(), self.outputs):
+            self.binding.bind_output(
+                model_output.name, 'cpu', 0, np.float32, list(outputs.shape), outputs.ctypes.data
+            )
+
+
+class PreprocessingEngine:
+    def __init__(self, session, spec: InputSpec = DEFAULT_INPUT_SPEC):
+        self.session = session
+        self.spec = spec
+        self.input_shape = tuple(session.get_inputs()[0].shape[1:])
+        self.output_shapes = [tuple(model_output.shape[1:]) for model_output in session.get_outputs()]
+        self.buffers = {}
+
+    def get_buffers(self, batch_size: int) -> BoundBuffers:
+        buffers = self.buffers.get(batch_size)
+        if buffers is None:
+            buffers = BoundBuffers(
+                self.session,
+                (batch_size, *self.input_shape),
+                self.output_shapes,
+            )
+            self.buffers[batch_size] = buffers
+        return buffers
+
+    def run(self, images) -> list:
+        buffers = self.get_buffers(len(images))
+        preprocess_into(images, buffers.inputs, self.spec)
+        self.session.run_with_iobinding(buffers.binding)
+        return buffers.outputs
@@ -0,0 +1,77 @@
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from benchmark_utils import augment_images, load_images
+from onnx_session import create_session
+from preprocessing import preprocess
+from settings import settings
+
+
+logging.basicConfig(
+    stream=sys.stdout,
+    level=logging.INFO,
+    format='{"time": "%(asctime)-s", "message": "%(message)s"}',
+    datefmt="%d-%m-%Y %H:%M:%S",
+)
+
+
+class ImageCalibrationReader(CalibrationDataReader):
+    def __init__(self, images: list, input_name: str):
+        self.images = iter(images)
+        self.input_name = input_name
+
+    def get_next(self):
+        image = next(self.images, None)
+        if image is None:
+            return None
+        return {self.input_name: preprocess([image])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the INT8 variant of the recognition model")
+    parser.add_argument('--model', default=settings.model_path)
+    parser.add_argument('--output', default=settings.quantized_model_path)
+    parser.add_argument('--mode', choices=['static', 'dynamic'], default='static')
+    parser.add_argument('--calibration-dir', default='../_samples')
+    parser.add_argument('--calibration-size', type=int, default=200)
+    parser.add_argument('--per-channel', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        prepared_path = os.path.join(tmp_dir, 'prepared.onnx')
+        quant_pre_process(args.model, prepared_path)
+
+        if args.mode == 'dynamic':
+            quantize_dynamic(prepared_path, args.output, weight_type=QuantType.QUInt8, per_channel=args.per_channel)
+        else:
+            input_name = create_session(args.model, ['CPUExecutionProvider']).get_inputs()[0].name
+            images = augment_images(load_images(args.calibration_dir), args.calibration_size)
+            quantize_static(
+                prepared_path,
+                args.output,
+                ImageCalibrationReader(images, input_name),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=args.per_channel,
+                calibrate_method=CalibrationMethod.MinMax,
+            )
+
+    logging.info(f"Saved {args.mode} INT8 model to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,7 @@ from typing import Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from models import TaskSegment, RecognitionResult, Label
+from models import TaskSegment, RecognitionResult, Label, RecognitionCacheEntry
 
 
 class TaskSegmentRepository:
@@ -60,3 +60,11 @@ class LabelRepository:
     async def get_all_labels(self):
         result = await self.session.execute(select(Label).order_by(Label.id))
         return [row.label for row in result.scalars().all()]
+
+
+class RecognitionCacheRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_entry(self, image_hash: str, model_version: str) -> Optional[RecognitionCacheEntry]:
+        return await self.session.get(RecognitionCacheEntry, (image_hash, model_version))
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+from metrics import metrics
+from models import RecognitionCacheEntry
+from repositories import RecognitionCacheRepository
+
+
+class ResultCache:
+    def __init__(self, model_version: str, max_size: int):
+        self.model_version = model_version
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def _remember(self, image_hash: str, entry: RecognitionCacheEntry):
+        self.entries[image_hash] = entry
+        self.entries.move_to_end(image_hash)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    async def get(self, session, image_hash: str):
+        entry = self.entries.get(image_hash)
+        if entry is not None:
+            self.entries.move_to_end(image_hash)
+            metrics.inc('result_cache_memory_hits')
+            return entry
+
+        entry = await RecognitionCacheRepository(session).get_entry(image_hash, self.model_version)
+        if entry is not None:
+            self._remember(image_hash, entry)
+            metrics.inc('result_cache_db_hits')
+            return entry
+
+        metrics.inc('result_cache_misses')
+        return None
+
+    def put(
+            self,
+            image_hash: str,
+            object_detected: str,
+            confidence: float,
+            result_file_url: str,
+            scores: bytes,
+            embedding: bytes = None,
+    ):
+        entry = RecognitionCacheEntry(
+            image_hash=image_hash,
+            model_version=self.model_version,
+            object_detected=object_detected,
+            confidence=float(confidence),
+            result_file_url=result_file_url,
+            scores=scores,
+            embedding=embedding,
+        )
+        self._remember(image_hash, entry)
+        return entry
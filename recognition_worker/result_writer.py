@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+
+from sqlalchemy import any_, insert, literal, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert as pg_insert
+
+from metrics import metrics
+from models import RecognitionCacheEntry, RecognitionResult, TaskSegment
+
+
+class BatchedResultWriter:
+    def __init__(self, session_factory, batch_size: int, flush_interval_ms: float):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        # (results, cache entries, statuses, waiter) per call, kept apart so a failed batch can be split
+        self.pending = []
+        self.size = 0
+        self.has_items = asyncio.Event()
+        self.full = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.has_items.is_set():
+            await self._flush_pending()
+
+    def _add(self, results: list, cache_entries: list, statuses: dict, wait: bool = False):
+        waiter = asyncio.get_running_loop().create_future() if wait else None
+        self.pending.append((results, cache_entries, statuses, waiter))
+        self.size += len(results) + len(statuses)
+        self.has_items.set()
+        if self.size >= self.batch_size:
+            self.full.set()
+        return waiter
+
+    def set_status(self, segment_id: str, status: str, error_message: str = None):
+        # Ids arrive as str and UUID, a later status of the same segment replaces an unflushed earlier one
+        self._add([], [], {str(segment_id): (status, error_message)})
+
+    async def write_status(self, segment_id: str, status: str, error_message: str = None):
+        await self._add([], [], {str(segment_id): (status, error_message)}, wait=True)
+
+    async def write_result(self, result: dict, cache_entry: RecognitionCacheEntry = None):
+        await self.write_results([result], cache_entry)
+
+    async def write_results(self, results: list, cache_entry: RecognitionCacheEntry = None, urgent: bool = False):
+        waiter = self._add(
+            results,
+            [cache_entry] if cache_entry is not None else [],
+            {str(results[0]['segment_id']): ('done', None)},
+            wait=True,
+        )
+        if urgent:
+            # Someone is waiting on this result, flush now together with whatever is already pending
+            self.full.set()
+        await waiter
+
+    def _take(self):
+        pending = self.pending
+        self.pending, self.size = [], 0
+        self.has_items.clear()
+        self.full.clear()
+        return pending
+
+    @staticmethod
+    def _merge(pending: list):
+        results, cache_entries, statuses = [], [], {}
+        for entry_results, entry_cache_entries, entry_statuses, _ in pending:
+            results.extend(entry_results)
+            cache_entries.extend(entry_cache_entries)
+            statuses.update(entry_statuses)
+        return results, cache_entries, statuses
+
+    async def _run(self):
+        while True:
+            await self.has_items.wait()
+            try:
+                await asyncio.wait_for(self.full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self._flush_pending()
+
+    async def _flush_pending(self):
+        await self._flush_split(self._take())
+
+    async def _flush_split(self, pending: list):
+        results, cache_entries, statuses = self._merge(pending)
+        try:
+            await self._flush(results, cache_entries, statuses)
+        except Exception as e:
+            if len(pending) > 1:
+                # One bad row, e.g. of a segment deleted meanwhile, must not fail the unrelated calls batched with it
+                logging.warning(f"Flush of {len(results)} results and {len(statuses)} statuses failed, "
+                                f"retrying in halves: {e}")
+                metrics.inc('result_writer_split_flushes')
+                middle = len(pending) // 2
+                await self._flush_split(pending[:middle])
+                await self._flush_split(pending[middle:])
+                return
+            logging.error(f"Flush of {len(results)} results and {len(statuses)} statuses failed: {e}")
+            metrics.inc('result_writer_failed_flushes')
+            waiter = pending[0][3]
+            if waiter is not None and not waiter.done():
+                waiter.set_exception(e)
+            return
+
+        metrics.inc('result_writer_flushes')
+        metrics.inc('result_writer_rows', len(results) + len(statuses))
+        for _, _, _, waiter in pending:
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+    async def _flush(self, results: list, cache_entries: list, statuses: dict):
+        grouped = {}
+        for segment_id, status in statuses.items():
+            grouped.setdefault(status, []).append(uuid.UUID(str(segment_id)))
+
+        async with self.session_factory() as session:
+            async with session.begin():
+                if results:
+                    await session.execute(insert(RecognitionResult).values(results))
+                if cache_entries:
+                    await session.execute(
+                        pg_insert(RecognitionCacheEntry)
+                        .values([
+                            {
+                                'image_hash': entry.image_hash,
+                                'model_version': entry.model_version,
+                                'object_detected': entry.object_detected,
+                                'confidence': entry.confidence,
+                                'result_file_url': entry.result_file_url,
+                                'scores': entry.scores,
+                                'embedding': entry.embedding,
+                                'created_at': datetime.now(),
+                            }
+                            for entry in cache_entries
+                        ])
+                        .on_conflict_do_nothing()
+                    )
+                for (status, error_message), segment_ids in grouped.items():
+                    await session.execute(
+                        update(TaskSegment)
+                        .where(TaskSegment.id == any_(literal(segment_ids, ARRAY(UUID(as_uuid=True)))))
+                        .values(status=status, error_message=error_message, updated_at=datetime.utcnow())
+                        .execution_options(synchronize_session=False)
+                    )
@@ -0,0 +1,173 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import any_, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from model_registry import ModelRegistry
+from models import RecognitionResult, TaskSegment
+from s3_utils import delete_files_by_prefix_from_s3
+from scores import build_label_table, classify, unpack_scores
+from settings import settings
+
+
+class LabelTables:
+    # Scores index the label map of the model that produced them, so every model_version gets its own table
+    def __init__(self, registry_dir: str, labels_path: str):
+        self.registry = ModelRegistry(registry_dir) if registry_dir else None
+        self.registry_versions = set(self.registry.versions()) if self.registry else set()
+        self.labels_path = labels_path
+        self.tables = {}
+
+    def load(self, path: str) -> np.ndarray:
+        with open(path, 'r') as f:
+            return build_label_table(json.load(f))
+
+    def get(self, model_version):
+        if model_version not in self.tables:
+            table = None
+            if model_version in self.registry_versions:
+                table = self.load(self.registry.get(model_version).labels_path)
+            elif self.labels_path:
+                table = self.load(self.labels_path)
+            else:
+                logging.warning(f"No label map for model version {model_version}, its results are skipped")
+            self.tables[model_version] = table
+        return self.tables[model_version]
+
+
+def build_query(args):
+    query = (
+        select(
+            RecognitionResult.id,
+            RecognitionResult.segment_id,
+            TaskSegment.task_id,
+            RecognitionResult.model_version,
+            RecognitionResult.object_detected,
+            RecognitionResult.scores,
+        )
+        .join(TaskSegment, TaskSegment.id == RecognitionResult.segment_id)
+        .where(RecognitionResult.scores.is_not(None))
+    )
+    if args.task_id:
+        query = query.where(TaskSegment.task_id == args.task_id)
+    if args.start is not None:
+        query = query.where(TaskSegment.start_time >= args.start)
+    if args.end is not None:
+        query = query.where(TaskSegment.start_time < args.end)
+    if args.since:
+        query = query.where(RecognitionResult.created_at >= args.since)
+    if args.until:
+        query = query.where(RecognitionResult.created_at < args.until)
+    return query
+
+
+def relabel(rows: list, label_tables: LabelTables, threshold: float) -> tuple:
+    # Blobs of different top-k sizes are unpacked separately, each group in one vectorized pass
+    groups = {}
+    for row in rows:
+        groups.setdefault((row.model_version, len(row.scores)), []).append(row)
+
+    changes = {}
+    segments = set()
+    skipped = 0
+    for (model_version, _), group in groups.items():
+        label_table = label_tables.get(model_version)
+        if label_table is None:
+            skipped += len(group)
+            continue
+        labels, _ = classify(*unpack_scores([row.scores for row in group]), label_table, threshold)
+        current = np.array([row.object_detected for row in group], dtype=object)
+        for index in np.flatnonzero(labels != current):
+            changes.setdefault(labels[index], []).append(group[index].id)
+            segments.add((group[index].task_id, group[index].segment_id))
+    return changes, segments, skipped
+
+
+async def apply_changes(session, changes: dict):
+    for label, result_ids in changes.items():
+        await session.execute(
+            update(RecognitionResult)
+            .where(RecognitionResult.id == any_(literal(result_ids, ARRAY(UUID(as_uuid=True)))))
+            .values(object_detected=label)
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def delete_annotations(segments: set):
+    # The original and every resized annotation, the API renders them again with the new labels on request
+    name_prefixes = {}
+    for task_id, segment_id in segments:
+        folder = f'recognition-results/{task_id}/'
+        name_prefixes.setdefault(folder, []).append(f'{folder}{segment_id}_result')
+    await delete_files_by_prefix_from_s3(name_prefixes)
+
+
+async def run(args):
+    label_tables = LabelTables(args.registry_dir, args.labels)
+    engine = create_async_engine(args.database_url, echo=False)
+    session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    scanned = 0
+    skipped = 0
+    changed = Counter()
+    annotations = set()
+    started = time.perf_counter()
+    try:
+        async with session_factory() as read_session, session_factory() as write_session:
+            result = await read_session.stream(build_query(args).execution_options(yield_per=args.chunk_size))
+            async for rows in result.partitions(args.chunk_size):
+                scanned += len(rows)
+                changes, segments, chunk_skipped = relabel(rows, label_tables, args.threshold)
+                skipped += chunk_skipped
+                changed.update({label: len(ids) for label, ids in changes.items()})
+                annotations.update(segments)
+                if changes and not args.dry_run:
+                    async with write_session.begin():
+                        await apply_changes(write_session, changes)
+                    await delete_annotations(segments)
+    finally:
+        await engine.dispose()
+
+    return {
+        'threshold': args.threshold,
+        'scanned': scanned,
+        'skipped': skipped,
+        'changed': sum(changed.values()),
+        'changed_by_label': dict(changed.most_common()),
+        'annotations': len(annotations),
+        'dry_run': args.dry_run,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recompute object_detected from stored scores with a new confidence threshold"
+    )
+    parser.add_argument('--threshold', type=float, required=True)
+    parser.add_argument('--task-id', default=None)
+    parser.add_argument('--start', type=float, default=None, help="Segment start time in seconds, inclusive")
+    parser.add_argument('--end', type=float, default=None, help="Segment start time in seconds, exclusive")
+    parser.add_argument('--since', type=datetime.fromisoformat, default=None, help="Result creation time, ISO format")
+    parser.add_argument('--until', type=datetime.fromisoformat, default=None)
+    parser.add_argument('--registry-dir', default=settings.model_registry_dir)
+    parser.add_argument('--labels', default=settings.labels_path,
+                        help="Label map for results whose model version is not in the registry")
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--database-url', default=settings.database_url)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -33,6 +33,37 @@ async def delete_file_from_s3(bucket_key):
         )
 
 
+async def delete_files_by_prefix_from_s3(name_prefixes: dict):
+    # {folder: [key prefixes]}, one listing per folder and DeleteObjects requests of up to 1000 keys over one client
+    deleted = 0
+    async with s3_session.client(
+            "s3",
+            endpoint_url=settings.s3_endpoint,
+            aws_access_key_id=settings.s3_access_key,
+            aws_secret_access_key=settings.s3_secret_key,
+    ) as s3_client:
+        keys = []
+        paginator = s3_client.get_paginator("list_objects_v2")
+        for folder, prefixes in name_prefixes.items():
+            prefixes = tuple(prefixes)
+            async for page in paginator.paginate(Bucket=settings.s3_bucket, Prefix=folder):
+                keys.extend(obj["Key"] for obj in page.get("Contents", []) if obj["Key"].startswith(prefixes))
+                while len(keys) >= 1000:
+                    deleted += await _delete_keys(s3_client, keys[:1000])
+                    keys = keys[1000:]
+        if keys:
+            deleted += await _delete_keys(s3_client, keys)
+    return deleted
+
+
+async def _delete_keys(s3_client, keys: list) -> int:
+    await s3_client.delete_objects(
+        Bucket=settings.s3_bucket,
+        Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True}
+    )
+    return len(keys)
+
+
 async def create_buckets_if_not_exists():
 
     bucket_names = [
@@ -93,3 +124,17 @@ async def download_file_from_s3_to_memory(bucket_key):
         response = await s3_client.get_object(Bucket=settings.s3_bucket, Key=bucket_key)
         data = await response['Body'].read()
         return data
+
+
+async def copy_file_in_s3(source_key: str, destination_key: str):
+    async with s3_session.client(
+        "s3",
+        endpoint_url=settings.s3_endpoint,
+        aws_access_key_id=settings.s3_access_key,
+        aws_secret_access_key=settings.s3_secret_key,
+    ) as s3_client:
+        await s3_client.copy_object(
+            Bucket=settings.s3_bucket,
+            Key=destination_key,
+            CopySource={"Bucket": settings.s3_bucket, "Key": source_key},
+        )
@@ -0,0 +1,37 @@
+import numpy as np
+
+UNKNOWN_LABEL = 'unknown'
+
+
+def pack_scores(scores: np.ndarray, top_k: int) -> bytes:
+    # Top-k class indices as uint16 followed by their scores as float16, best first
+    top_k = min(top_k or len(scores), len(scores))
+    indices = np.argpartition(scores, -top_k)[-top_k:]
+    indices = indices[np.argsort(scores[indices])[::-1]]
+    return indices.astype(np.uint16).tobytes() + scores[indices].astype(np.float16).tobytes()
+
+
+def unpack_scores(blobs: list):
+    # All blobs in one call must share the same k, rows are grouped by length by the caller
+    top_k = len(blobs[0]) // 4
+    packed = np.frombuffer(b''.join(blobs), dtype=np.uint8).reshape(len(blobs), top_k * 4)
+    indices = packed[:, :top_k * 2].copy().view(np.uint16)
+    scores = packed[:, top_k * 2:].copy().view(np.float16)
+    return indices, scores
+
+
+def pack_embedding(embedding: np.ndarray) -> bytes:
+    return embedding.astype(np.float16).tobytes()
+
+
+def build_label_table(labels: dict) -> np.ndarray:
+    # Index len(labels) maps to the unknown label
+    table = [labels[str(i)] for i in range(len(labels))]
+    return np.array(table + [UNKNOWN_LABEL], dtype=object)
+
+
+def classify(indices: np.ndarray, scores: np.ndarray, label_table: np.ndarray, threshold: float):
+    top_classes = indices[:, 0].astype(np.int64)
+    confidences = scores[:, 0].astype(np.float32)
+    top_classes[confidences <= threshold] = len(label_table) - 1
+    return label_table[top_classes], confidences
@@ -1,4 +1,6 @@
-from pydantic import Field, ConfigDict
+from typing import Literal
+
+from pydantic import Field, ConfigDict, model_validator
 from pydantic_settings import BaseSettings
 
 
@@ -35,8 +37,231 @@ class Settings(BaseSettings):
         default='recognition_queue',
         validation_alias='RECOGNITION_QUEUE'
     )
+    recognition_prefetch_count: int = Field(
+        default=64,
+        validation_alias='RECOGNITION_PREFETCH_COUNT'
+    )
+    recognition_max_in_flight: int = Field(
+        default=64,
+        validation_alias='RECOGNITION_MAX_IN_FLIGHT'
+    )
+    photo_recognition_queue: str = Field(
+        default='photo_recognition_queue',
+        validation_alias='PHOTO_RECOGNITION_QUEUE'
+    )
+    photo_prefetch_count: int = Field(
+        default=16,
+        validation_alias='PHOTO_PREFETCH_COUNT'
+    )
+    photo_max_in_flight: int = Field(
+        default=16,
+        validation_alias='PHOTO_MAX_IN_FLIGHT'
+    )
+    photo_batch_size: int = Field(
+        default=8,
+        validation_alias='PHOTO_BATCH_SIZE'
+    )
+    photo_batch_max_wait_ms: float = Field(
+        default=0.0,
+        validation_alias='PHOTO_BATCH_MAX_WAIT_MS'
+    )
+    photo_lane_share: float = Field(
+        default=0.25,
+        validation_alias='PHOTO_LANE_SHARE'
+    )
+    photo_pipeline_concurrency: int = Field(
+        default=16,
+        validation_alias='PHOTO_PIPELINE_CONCURRENCY'
+    )
+    model_path: str = Field(
+        default='model/efficientnet-lite4-11.onnx',
+        validation_alias='MODEL_PATH'
+    )
+    quantized_model_path: str = Field(
+        default='model/efficientnet-lite4-11.int8.onnx',
+        validation_alias='QUANTIZED_MODEL_PATH'
+    )
+    model_variant: Literal['fp32', 'int8'] = Field(
+        default='fp32',
+        validation_alias='MODEL_VARIANT'
+    )
+    labels_path: str = Field(
+        default='labels_map.txt',
+        validation_alias='LABELS_PATH'
+    )
+    model_registry_dir: str = Field(
+        default='',
+        validation_alias='MODEL_REGISTRY_DIR'
+    )
+    model_registry_poll_interval: float = Field(
+        default=10.0,
+        validation_alias='MODEL_REGISTRY_POLL_INTERVAL'
+    )
+    recognition_threshold: float = Field(
+        default=0.8,
+        validation_alias='RECOGNITION_THRESHOLD'
+    )
+    stored_scores_top_k: int = Field(
+        default=5,
+        validation_alias='STORED_SCORES_TOP_K'
+    )
+    embeddings_enabled: bool = Field(
+        default=True,
+        validation_alias='EMBEDDINGS_ENABLED'
+    )
+    embedding_output_name: str = Field(
+        default='',
+        validation_alias='EMBEDDING_OUTPUT_NAME'
+    )
+    tiling_enabled: bool = Field(
+        default=False,
+        validation_alias='TILING_ENABLED'
+    )
+    tiling_min_side: int = Field(
+        default=1024,
+        validation_alias='TILING_MIN_SIDE'
+    )
+    tiling_grid: int = Field(
+        default=2,
+        validation_alias='TILING_GRID'
+    )
+    tiling_overlap: float = Field(
+        default=0.25,
+        validation_alias='TILING_OVERLAP'
+    )
+    tiling_max_tiles: int = Field(
+        default=8,
+        validation_alias='TILING_MAX_TILES'
+    )
+    cascade_model_path: str = Field(
+        default='',
+        validation_alias='CASCADE_MODEL_PATH'
+    )
+    cascade_threshold: float = Field(
+        default=0.9,
+        validation_alias='CASCADE_THRESHOLD'
+    )
+    cascade_model_layout: Literal['nchw', 'nhwc'] = Field(
+        default='nchw',
+        validation_alias='CASCADE_MODEL_LAYOUT'
+    )
+    cascade_model_mean: list[float] = Field(
+        default=[123.675, 116.28, 103.53],
+        validation_alias='CASCADE_MODEL_MEAN'
+    )
+    cascade_model_std: list[float] = Field(
+        default=[58.395, 57.12, 57.375],
+        validation_alias='CASCADE_MODEL_STD'
+    )
+    cascade_model_rgb: bool = Field(
+        default=True,
+        validation_alias='CASCADE_MODEL_RGB'
+    )
+    cascade_model_softmax: bool = Field(
+        default=True,
+        validation_alias='CASCADE_MODEL_SOFTMAX'
+    )
+    cascade_inference_workers: int = Field(
+        default=0,
+        validation_alias='CASCADE_INFERENCE_WORKERS'
+    )
+    inference_batch_size: int = Field(
+        default=16,
+        validation_alias='INFERENCE_BATCH_SIZE'
+    )
+    inference_batch_max_wait_ms: float = Field(
+        default=25.0,
+        validation_alias='INFERENCE_BATCH_MAX_WAIT_MS'
+    )
+    inference_workers: int = Field(
+        default=0,
+        validation_alias='INFERENCE_WORKERS'
+    )
+    inference_intra_op_threads: int = Field(
+        default=0,
+        validation_alias='INFERENCE_INTRA_OP_THREADS'
+    )
+    inference_inter_op_threads: int = Field(
+        default=0,
+        validation_alias='INFERENCE_INTER_OP_THREADS'
+    )
+    inference_execution_mode: Literal['sequential', 'parallel'] = Field(
+        default='sequential',
+        validation_alias='INFERENCE_EXECUTION_MODE'
+    )
+    inference_graph_optimization: Literal['disabled', 'basic', 'extended', 'all'] = Field(
+        default='all',
+        validation_alias='INFERENCE_GRAPH_OPTIMIZATION'
+    )
+    cache_optimized_model: bool = Field(
+        default=True,
+        validation_alias='CACHE_OPTIMIZED_MODEL'
+    )
+    optimized_model_dir: str = Field(
+        default='model/optimized',
+        validation_alias='OPTIMIZED_MODEL_DIR'
+    )
+    inference_warmup_runs: int = Field(
+        default=2,
+        validation_alias='INFERENCE_WARMUP_RUNS'
+    )
+    result_cache_enabled: bool = Field(
+        default=True,
+        validation_alias='RESULT_CACHE_ENABLED'
+    )
+    result_cache_size: int = Field(
+        default=10000,
+        validation_alias='RESULT_CACHE_SIZE'
+    )
+    eager_result_images: bool = Field(
+        default=True,
+        validation_alias='EAGER_RESULT_IMAGES'
+    )
+    result_image_max_side: int = Field(
+        default=0,
+        validation_alias='RESULT_IMAGE_MAX_SIDE'
+    )
+    reduced_decode: bool = Field(
+        default=True,
+        validation_alias='REDUCED_DECODE'
+    )
+    pipeline_fetch_concurrency: int = Field(
+        default=16,
+        validation_alias='PIPELINE_FETCH_CONCURRENCY'
+    )
+    pipeline_infer_concurrency: int = Field(
+        default=0,
+        validation_alias='PIPELINE_INFER_CONCURRENCY'
+    )
+    pipeline_persist_concurrency: int = Field(
+        default=16,
+        validation_alias='PIPELINE_PERSIST_CONCURRENCY'
+    )
+    pipeline_queue_size: int = Field(
+        default=64,
+        validation_alias='PIPELINE_QUEUE_SIZE'
+    )
+    result_writer_batch_size: int = Field(
+        default=256,
+        validation_alias='RESULT_WRITER_BATCH_SIZE'
+    )
+    result_writer_flush_ms: float = Field(
+        default=50.0,
+        validation_alias='RESULT_WRITER_FLUSH_MS'
+    )
+    metrics_report_interval: float = Field(
+        default=60.0,
+        validation_alias='METRICS_REPORT_INTERVAL'
+    )
 
     model_config = ConfigDict(extra="ignore")
 
+    @model_validator(mode='after')
+    def check_embeddings_without_cascade(self):
+        # Images the fast stage accepts never reach the model with the embedding output, /similar would miss most
+        if self.embeddings_enabled and self.cascade_model_path:
+            raise ValueError("EMBEDDINGS_ENABLED cannot be combined with CASCADE_MODEL_PATH, disable one of them")
+        return self
+
 
 settings = Settings()
@@ -0,0 +1,58 @@
+import asyncio
+import uuid
+
+from result_writer import BatchedResultWriter
+
+
+def test_later_status_of_segment_replaces_earlier_in_same_flush():
+    flushed = []
+
+    async def scenario():
+        writer = BatchedResultWriter(session_factory=None, batch_size=100, flush_interval_ms=10000)
+
+        async def capture(results, cache_entries, statuses):
+            flushed.append(statuses)
+
+        writer._flush = capture
+        segment_id = uuid.uuid4()
+        writer.set_status(str(segment_id), 'processing')
+        pending = asyncio.ensure_future(
+            writer.write_results([{'segment_id': segment_id, 'object_detected': 'cat', 'confidence': 0.9}])
+        )
+        await asyncio.sleep(0)
+        await writer._flush_pending()
+        await pending
+        return segment_id
+
+    segment_id = asyncio.run(scenario())
+    assert flushed == [{str(segment_id): ('done', None)}]
+
+
+def test_bad_row_fails_only_its_own_call():
+    flushed = []
+    bad_segment_id = uuid.uuid4()
+
+    async def scenario():
+        writer = BatchedResultWriter(session_factory=None, batch_size=100, flush_interval_ms=10000)
+
+        async def flush(results, cache_entries, statuses):
+            if any(result['segment_id'] == bad_segment_id for result in results):
+                raise ValueError('segment does not exist')
+            flushed.extend(result['segment_id'] for result in results)
+
+        writer._flush = flush
+        segment_ids = [uuid.uuid4(), uuid.uuid4(), bad_segment_id, uuid.uuid4(), uuid.uuid4()]
+        pending = [
+            asyncio.ensure_future(
+                writer.write_results([{'segment_id': segment_id, 'object_detected': 'cat', 'confidence': 0.9}])
+            )
+            for segment_id in segment_ids
+        ]
+        await asyncio.sleep(0)
+        await writer._flush_pending()
+        outcomes = await asyncio.gather(*pending, return_exceptions=True)
+        return segment_ids, outcomes
+
+    segment_ids, outcomes = asyncio.run(scenario())
+    assert sorted(flushed) == sorted(segment_id for segment_id in segment_ids if segment_id != bad_segment_id)
+    assert [isinstance(outcome, ValueError) for outcome in outcomes] == [False, False, True, False, False]
@@ -0,0 +1,32 @@
+import numpy as np
+
+from cascade import Prediction
+from tiling import aggregate, make_tiles
+
+
+def prediction(*scores):
+    return Prediction(np.array(scores, dtype=np.float32), 'full')
+
+
+def test_tile_class_kept_when_global_view_is_below_threshold():
+    global_view = prediction(0.5, 0.3, 0.2)
+    tile = prediction(0.95, 0.03, 0.02)
+
+    assert aggregate([global_view, tile], 0.8) == [global_view, tile]
+
+
+def test_tile_class_dropped_when_global_view_reported_it():
+    global_view = prediction(0.9, 0.05, 0.05)
+    same_class = prediction(0.95, 0.03, 0.02)
+    other_class = prediction(0.05, 0.9, 0.05)
+
+    assert aggregate([global_view, same_class, other_class], 0.8) == [global_view, other_class]
+
+
+def test_tiles_are_cut_at_model_input_size():
+    image = np.zeros((3000, 4000, 3), dtype=np.uint8)
+
+    tiles = make_tiles(image, grid=2, overlap=0.25, max_tiles=8)
+
+    assert tiles
+    assert all(tile.shape == (224, 224, 3) for tile in tiles)
@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+
+from preprocessing import INPUT_SIZE
+
+
+def plan_tiles(width: int, height: int, tile: int, overlap: float, max_tiles: int) -> list:
+    # Square tiles spread evenly so the last one touches the edge
+    stride = tile * (1 - overlap)
+    columns = max(1, int(np.ceil((width - tile) / stride)) + 1)
+    rows = max(1, int(np.ceil((height - tile) / stride)) + 1)
+    while columns * rows > max_tiles and max(columns, rows) > 1:
+        if columns >= rows:
+            columns -= 1
+        else:
+            rows -= 1
+    xs = np.linspace(0, width - tile, columns).round().astype(int)
+    ys = np.linspace(0, height - tile, rows).round().astype(int)
+    return [(x, y, tile, tile) for y in ys for x in xs]
+
+
+def crop_tiles(image: np.ndarray, tiles: list) -> list:
+    return [image[y:y + size_y, x:x + size_x] for x, y, size_x, size_y in tiles]
+
+
+def make_tiles(image: np.ndarray, grid: int, overlap: float, max_tiles: int, tile: int = INPUT_SIZE) -> list:
+    # Tiles are cut at the model input size from the photo scaled once so that `grid` of them span the short side,
+    # the model then sees them as is instead of every crop being resized on its own
+    height, width = image.shape[:2]
+    scale = tile * (grid - (grid - 1) * overlap) / min(width, height)
+    if scale < 1:
+        width, height = max(tile, round(width * scale)), max(tile, round(height * scale))
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    return crop_tiles(image, plan_tiles(width, height, tile, overlap, max_tiles))
+
+
+def aggregate(predictions: list, threshold: float) -> list:
+    # The global view always yields a result, tiles add the classes it missed
+    global_prediction, tile_predictions = predictions[0], predictions[1:]
+    global_class = int(np.argmax(global_prediction.scores))
+    # A global view below the threshold is stored as unknown, so a tile confident in its class still counts
+    reported_class = global_class if global_prediction.scores[global_class] > threshold else None
+    found = {}
+    for prediction in tile_predictions:
+        top_class = int(np.argmax(prediction.scores))
+        confidence = float(prediction.scores[top_class])
+        if confidence <= threshold or top_class == reported_class:
+            continue
+        if top_class not in found or confidence > found[top_class][0]:
+            found[top_class] = (confidence, prediction)
+    extra = sorted(found.values(), key=lambda item: item[0], reverse=True)
+    return [global_prediction] + [prediction for _, prediction in extra]
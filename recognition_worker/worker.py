@@ -1,22 +1,38 @@
 import asyncio
+import functools
+import hashlib
 import json
 import logging
+import os
 import sys
+import time
 import uuid
 from datetime import datetime
 
 import aio_pika
 import cv2
 import numpy as np
-import onnxruntime as ort
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
-from models import RecognitionResult
-from rmq_utils import rmq
-from repositories import TaskSegmentRepository, RecognitionResultRepository, LabelRepository
-from s3_utils import download_file_from_s3_to_memory, save_bytes_to_s3
+from batcher import InferenceBatcher
+from cascade import CascadeInference, SingleStage
+from decoding import decode_image, read_jpeg_size
+from inference_pool import InferencePool, LocalInference
+from metrics import metrics
+from model_registry import LoadedModel, ModelEntry, ModelRegistry
+from model_utils import get_model_version
+from onnx_session import get_providers, get_warmup_batch_sizes, prepare_model
+from pipeline import Pipeline, RecognitionJob
+from preprocessing import DEFAULT_INPUT_SPEC, INPUT_SIZE, InputSpec
+from result_cache import ResultCache
+from result_writer import BatchedResultWriter
+from rmq_utils import InFlightLimiter, rmq
+from repositories import LabelRepository
+from scores import UNKNOWN_LABEL, classify, pack_embedding, pack_scores, unpack_scores
+from s3_utils import copy_file_in_s3, download_file_from_s3_to_memory, save_bytes_to_s3
 from settings import settings
+from tiling import aggregate, make_tiles
 
 
 logging.basicConfig(
@@ -31,118 +47,432 @@ class RecognitionWorker:
     def __init__(self):
         self.engine = None
         self.AsyncSessionLocal = None
-        self.labels = None
-        self.ort_session = None
+        self.registry = ModelRegistry(settings.model_registry_dir) if settings.model_registry_dir else None
+        self.model = None
+        self.failed_version = None
+        self.result_writer = None
+        self.pipelines = {}
+        self.metrics_task = None
+        self.registry_task = None
+        self.started_at = time.monotonic()
+        self.first_ack_logged = False
 
     async def initialize(self):
         await self.initialize_database()
-        await self.load_labels()
-        await self.load_model()
+        self.model = await self.load_model(await asyncio.to_thread(self.get_model_entry))
+        self.start_pipelines()
+        metrics.register('model_version', lambda: self.model.version)
+        self.metrics_task = asyncio.create_task(metrics.report(settings.metrics_report_interval))
+        if self.registry:
+            self.registry_task = asyncio.create_task(self.watch_registry())
+        logging.info(f"Recognition worker initialized in {time.monotonic() - self.started_at:.2f}s")
 
     async def initialize_database(self):
         self.engine = create_async_engine(settings.database_url, echo=False)
         self.AsyncSessionLocal = sessionmaker(self.engine, expire_on_commit=False, class_=AsyncSession)
+        self.result_writer = BatchedResultWriter(
+            self.AsyncSessionLocal, settings.result_writer_batch_size, settings.result_writer_flush_ms
+        )
+        self.result_writer.start()
+
+    def get_model_entry(self) -> ModelEntry:
+        if self.registry:
+            return self.registry.active()
+        model_path = settings.quantized_model_path if settings.model_variant == 'int8' else settings.model_path
+        return ModelEntry(None, model_path, settings.labels_path)
+
+    async def load_model(self, entry: ModelEntry) -> LoadedModel:
+        with open(entry.labels_path, "r") as f:
+            labels = json.load(f)
+        providers = get_providers()
+        full_inference, batch_size = await self.start_inference(
+            entry.model_path, providers, settings.inference_workers, DEFAULT_INPUT_SPEC, settings.embeddings_enabled
+        )
+        model_version = await asyncio.to_thread(get_model_version, entry.model_path)
+
+        if settings.cascade_model_path:
+            input_spec = InputSpec(
+                settings.cascade_model_layout,
+                settings.cascade_model_mean,
+                settings.cascade_model_std,
+                settings.cascade_model_rgb,
+            )
+            fast_inference, fast_batch_size = await self.start_inference(
+                settings.cascade_model_path,
+                providers,
+                settings.cascade_inference_workers or settings.inference_workers,
+                input_spec,
+            )
+            inference = CascadeInference(
+                fast_inference, full_inference, settings.cascade_threshold, settings.cascade_model_softmax
+            )
+            # Uncertain images of a fast batch go to the full model as one batch
+            batch_size = min(batch_size, fast_batch_size)
+            fast_version = await asyncio.to_thread(get_model_version, settings.cascade_model_path)
+            model_version = f'{fast_version}>{model_version}@{settings.cascade_threshold}'
+            logging.info(f"Cascade enabled, full model runs below confidence {settings.cascade_threshold}")
+        else:
+            inference = SingleStage(full_inference)
+
+        result_cache = None
+        if settings.result_cache_enabled:
+            result_cache = ResultCache(model_version, settings.result_cache_size)
 
-    async def load_labels(self):
-        with open("labels_map.txt", "r") as f:
-            self.labels = json.load(f)
+        # Video batches only get the slots left after the photo share, so a photo never waits behind a backlog
+        photo_slots = max(1, round(inference.concurrency * settings.photo_lane_share))
+        photo_batch_size = settings.photo_batch_size
+        if settings.tiling_enabled:
+            # A tiled photo's global view and tiles have to fit one batch to run in one session call
+            photo_batch_size = max(photo_batch_size, 1 + settings.tiling_max_tiles)
+        batchers = {
+            'photo': InferenceBatcher(
+                inference.run,
+                min(photo_batch_size, batch_size),
+                settings.photo_batch_max_wait_ms,
+                max_concurrent_batches=photo_slots,
+            ),
+            'video': InferenceBatcher(
+                inference.run,
+                batch_size,
+                settings.inference_batch_max_wait_ms,
+                max_concurrent_batches=max(1, inference.concurrency - photo_slots),
+            ),
+        }
+        for batcher in batchers.values():
+            batcher.start()
+        logging.info(f"Model {entry.version or model_version} loaded, inference batch size {batch_size}, "
+                     f"{photo_slots} of {inference.concurrency} inference slots kept for photos")
+        return LoadedModel(entry.version or model_version, inference, batchers, labels, result_cache)
 
-    async def load_model(self):
-        gpu_available = await self.check_gpu_availability()
-        providers = ['CUDAExecutionProvider'] if gpu_available else ['CPUExecutionProvider']
+    async def watch_registry(self):
+        while True:
+            await asyncio.sleep(settings.model_registry_poll_interval)
+            version = None
+            try:
+                version = await asyncio.to_thread(self.registry.active_version)
+                if version not in (self.model.version, self.failed_version):
+                    await self.swap_model(await asyncio.to_thread(self.registry.get, version))
+            except Exception as e:
+                self.failed_version = version
+                logging.error(f"Rollout of model {version} failed, staying on {self.model.version}: {e}")
+
+    async def swap_model(self, entry: ModelEntry):
+        # The old model keeps serving while the new one loads and warms up
+        started = time.monotonic()
+        new_model = await self.load_model(entry)
+        old_model, self.model = self.model, new_model
+        metrics.inc('model_swaps')
+        logging.info(f"Switched from model {old_model.version} to {new_model.version}, "
+                     f"loaded in {time.monotonic() - started:.2f}s")
+        await old_model.close()
+        logging.info(f"Model {old_model.version} drained and unloaded")
 
-        model_path = 'model/efficientnet-lite4-11.onnx'
-        self.ort_session = ort.InferenceSession(model_path, providers=providers)
+    @staticmethod
+    async def start_inference(model_path, providers, workers, input_spec, embeddings=False):
+        phase_started = time.monotonic()
+        prepared_model = await asyncio.to_thread(
+            prepare_model, model_path, providers, settings.inference_batch_size, embeddings
+        )
+        logging.info(f"Model {prepared_model.path} prepared in {time.monotonic() - phase_started:.2f}s")
 
-    async def check_gpu_availability(self):
-        providers = ort.get_available_providers()
+        phase_started = time.monotonic()
         if 'CUDAExecutionProvider' in providers:
-            return True
-        return False
+            inference = LocalInference(prepared_model.session, input_spec)
+        else:
+            workers = workers or os.cpu_count()
+            intra_op_threads = settings.inference_intra_op_threads or 1
+            inference = InferencePool(prepared_model, providers, workers, intra_op_threads, input_spec)
+        await inference.start(get_warmup_batch_sizes(prepared_model.batch_size), settings.inference_warmup_runs)
+        logging.info(f"Inference for {prepared_model.path} started and warmed up in {time.monotonic() - phase_started:.2f}s")
+        return inference, prepared_model.batch_size
 
-    async def process_message(self, message: aio_pika.IncomingMessage):
-        async with message.process():
-            task_data = json.loads(message.body.decode())
-            await self.process_task(task_data)
+    def start_pipelines(self):
+        video_batcher = self.model.batchers['video']
+        infer_concurrency = settings.pipeline_infer_concurrency or (
+            video_batcher.max_batch_size * video_batcher.max_concurrent_batches
+        )
+        self.pipelines['video'] = Pipeline(
+            [
+                ('fetch', self.fetch_stage, settings.pipeline_fetch_concurrency),
+                ('infer', self.infer_stage, infer_concurrency),
+                ('persist', self.persist_stage, settings.pipeline_persist_concurrency),
+            ],
+            settings.pipeline_queue_size,
+            self.handle_error,
+            'video',
+        )
+        # Photos get their own stage workers and queues, so they never queue behind video frames
+        self.pipelines['photo'] = Pipeline(
+            [
+                ('fetch', self.fetch_stage, settings.photo_pipeline_concurrency),
+                ('infer', self.infer_stage, settings.photo_pipeline_concurrency),
+                ('persist', self.persist_stage, settings.photo_pipeline_concurrency),
+            ],
+            settings.photo_pipeline_concurrency,
+            self.handle_error,
+            'photo',
+        )
+        for pipeline in self.pipelines.values():
+            pipeline.start()
+
+    async def close(self):
+        if self.metrics_task:
+            self.metrics_task.cancel()
+        if self.registry_task:
+            self.registry_task.cancel()
+        for pipeline in self.pipelines.values():
+            await pipeline.stop()
+        if self.result_writer:
+            await self.result_writer.stop()
+        if self.model:
+            await self.model.close()
+        if self.engine:
+            await self.engine.dispose()
+
+    async def process_message(self, message: aio_pika.IncomingMessage, lane: str = 'video'):
+        started = time.monotonic()
+        # Only failures to persist the outcome are worth a redelivery, a malformed message never gets better
+        async with message.process(requeue=True, ignore_processed=True):
+            try:
+                job = RecognitionJob(json.loads(message.body.decode()), lane)
+            except (ValueError, KeyError, TypeError) as e:
+                logging.error(f"Rejecting malformed recognition message: {e!r}")
+                metrics.inc('recognition_rejected')
+                await message.reject(requeue=False)
+                return
+            await self.submit_job(job)
+        metrics.observe(f'{lane}_message', time.monotonic() - started)
+
+        if not self.first_ack_logged:
+            self.first_ack_logged = True
+            logging.info(f"First message acked {time.monotonic() - self.started_at:.2f}s after start")
 
-    async def process_task(self, task_data):
-        segment_id = task_data['segment_id']
-        task_id = task_data['task_id']
-        image_file_url = task_data.get('image_file_url')
+    async def process_task(self, task_data, lane: str = 'video'):
+        await self.submit_job(RecognitionJob(task_data, lane))
 
-        if not image_file_url:
-            logging.error(f"No image_file_url provided for segment {segment_id}")
+    async def submit_job(self, job: RecognitionJob):
+        if not job.image_file_url:
+            logging.error(f"No image_file_url provided for segment {job.segment_id}")
             return
+        await self.pipelines[job.lane].submit(job)
 
-        async with self.AsyncSessionLocal() as session:
-            segment_repo = TaskSegmentRepository(session)
-            result_repo = RecognitionResultRepository(session)
+    async def fetch_stage(self, job: RecognitionJob):
+        self.result_writer.set_status(job.segment_id, 'processing')
+        job.image_data = await download_file_from_s3_to_memory(job.image_file_url)
+        # Tiled photos yield several results, the cache holds one per image
+        tiling = settings.tiling_enabled and job.file_type == 'photo'
+        model = self.model
+        if model.result_cache and not tiling:
+            job.image_hash = (await asyncio.to_thread(hashlib.sha256, job.image_data)).hexdigest()
+            async with self.AsyncSessionLocal() as session:
+                job.cached = await model.result_cache.get(session, job.image_hash)
+            if job.cached:
+                job.model, job.model_version = model, model.version
 
-            await segment_repo.update_segment_status(segment_id, 'processing')
+        if tiling:
+            job.image = await self.decode_image(job.image_data, settings.tiling_min_side)
+            job.tiled = min(job.image.shape[:2]) >= settings.tiling_min_side
+        elif not job.cached:
+            job.image = await self.decode_image(job.image_data)
+        if not self.needs_full_decode(job):
+            job.image_data = None
 
-            try:
-                image = await self.download_image(image_file_url)
-                object_detected, confidence = await self.perform_inference(image)
-                result_file_url = await self.save_result_image(image, object_detected, confidence, segment_id, task_id)
-                await self.save_result(result_repo, segment_id, object_detected, confidence, result_file_url)
-                await segment_repo.update_segment_status(segment_id, 'done')
-            except Exception as e:
-                await segment_repo.update_segment_status(segment_id, 'error', error_message=str(e))
-                logging.error(f"Error processing segment {segment_id}: {e}")
+    async def infer_stage(self, job: RecognitionJob):
+        if job.cached:
+            job.object_detected, job.confidence = job.cached.object_detected, job.cached.confidence
+            job.scores, job.embedding = job.cached.scores, job.cached.embedding
+            if job.scores:
+                # Cached entries may predate a threshold change
+                labels, _ = classify(
+                    *unpack_scores([job.scores]), job.model.label_table, settings.recognition_threshold
+                )
+                job.object_detected = labels[0]
+            job.model_stage = 'cache'
+            return
+
+        # New batches go to whichever model is current, a swap waits for jobs already on the old one
+        model = self.model.acquire()
+        try:
+            batcher = model.batchers[job.lane]
+            if job.tiled:
+                predictions = await self.perform_tiled_inference(batcher, job.image)
+            else:
+                predictions = [await batcher.infer(job.image)]
+        finally:
+            model.release()
+        job.model, job.model_version = model, model.version
+        if job.tiled:
+            # Tile crops would only crowd the similarity index, embeddings are kept for the whole photo
+            job.extra_results = [
+                {**self.describe_prediction(model, prediction), 'embedding': None} for prediction in predictions[1:]
+            ]
+        result = self.describe_prediction(model, predictions[0])
+        job.object_detected, job.confidence = result['object_detected'], result['confidence']
+        job.scores, job.embedding, job.model_stage = result['scores'], result['embedding'], result['model_stage']
+
+    async def persist_stage(self, job: RecognitionJob):
+        if job.cached:
+            job.result_file_url = await self.copy_result_image(job.cached.result_file_url, job.segment_id, job.task_id)
+        elif settings.eager_result_images:
+            image = job.image
+            if job.image_data is not None:
+                image = await asyncio.to_thread(cv2.imdecode, np.frombuffer(job.image_data, np.uint8), cv2.IMREAD_COLOR)
+            job.result_file_url = await self.save_result_image(
+                image, job.object_detected, job.confidence, job.segment_id, job.task_id
+            )
+        job.image = None
+        job.image_data = None
 
-    async def download_image(self, image_file_url):
-        image_data = await download_file_from_s3_to_memory(image_file_url)
-        image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+        cache_entry = None
+        if job.model.result_cache and job.image_hash and not job.cached:
+            cache_entry = job.model.result_cache.put(
+                job.image_hash, job.object_detected, job.confidence, job.result_file_url, job.scores, job.embedding
+            )
+        segment_id = uuid.UUID(job.segment_id)
+        await self.result_writer.write_results(
+            [
+                {
+                    'id': uuid.uuid4(),
+                    'segment_id': segment_id,
+                    'object_detected': job.object_detected,
+                    'confidence': float(job.confidence),
+                    'result_file_url': job.result_file_url,
+                    'model_stage': job.model_stage,
+                    'model_version': job.model_version,
+                    'scores': job.scores,
+                    'embedding': job.embedding,
+                    'created_at': datetime.now(),
+                },
+                *(
+                    {
+                        'id': uuid.uuid4(),
+                        'segment_id': segment_id,
+                        'result_file_url': job.result_file_url,
+                        'model_version': job.model_version,
+                        'created_at': datetime.now(),
+                        **extra,
+                    }
+                    for extra in job.extra_results
+                ),
+            ],
+            cache_entry,
+            urgent=job.lane == 'photo',
+        )
+
+    async def handle_error(self, job: RecognitionJob, error: Exception):
+        logging.error(f"Error processing segment {job.segment_id}: {error}")
+        await self.result_writer.write_status(job.segment_id, 'error', error_message=str(error))
+
+    @staticmethod
+    def needs_full_decode(job: RecognitionJob) -> bool:
+        # A full-resolution annotation decodes the source again, only when it is rendered and the model got less
+        if job.image is None or not settings.eager_result_images or settings.result_image_max_side:
+            return False
+        size = read_jpeg_size(job.image_data)
+        return size is not None and job.image.shape[1] < size[0]
+
+    @staticmethod
+    async def decode_image(image_data, min_side=INPUT_SIZE):
+        # The model input sets the minimum size, a bounded annotation size raises it
+        if not settings.reduced_decode:
+            image = await asyncio.to_thread(cv2.imdecode, np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+        else:
+            min_long_side = settings.result_image_max_side if settings.eager_result_images else 0
+            image = await asyncio.to_thread(decode_image, image_data, min_side, min_long_side)
         if image is None:
             raise Exception("Failed to read image")
         return image
 
-    async def perform_inference(self, image):
-        input_size = 224
-        image_resized = cv2.resize(image, (input_size, input_size))
-        image_data = np.expand_dims(image_resized.astype(np.float32), axis=0)
-
-        mean = np.array([127.0, 127.0, 127.0])
-        std = np.array([128.0, 128.0, 128.0])
-        image_data = (image_data - mean) / std
+    @staticmethod
+    async def copy_result_image(cached_file_url, segment_id, task_id):
+        if not cached_file_url:
+            return None
+        result_file_url = f'recognition-results/{task_id}/{segment_id}_result.jpg'
+        try:
+            await copy_file_in_s3(cached_file_url, result_file_url)
+        except Exception as e:
+            logging.warning(f"Could not reuse result image {cached_file_url}: {e}")
+            return None
+        return result_file_url
 
-        ort_inputs = {self.ort_session.get_inputs()[0].name: image_data.astype(np.float32)}
-        ort_outs = self.ort_session.run(None, ort_inputs)
-        predictions = ort_outs[0]
+    @staticmethod
+    def describe_prediction(model: LoadedModel, prediction):
+        top_class = np.argmax(prediction.scores)
+        confidence = prediction.scores[top_class]
+        object_detected = model.labels[str(top_class)] if confidence > settings.recognition_threshold else UNKNOWN_LABEL
+        return {
+            'object_detected': object_detected,
+            'confidence': float(confidence),
+            'model_stage': prediction.stage,
+            'scores': pack_scores(prediction.scores, settings.stored_scores_top_k),
+            'embedding': pack_embedding(prediction.embedding) if prediction.embedding is not None else None,
+        }
 
-        top_class = np.argmax(predictions)
-        confidence = predictions[0][top_class]
-        object_detected = self.labels[str(top_class)] if confidence > 0.8 else 'unknown'
-        return object_detected, confidence
+    @staticmethod
+    async def perform_tiled_inference(batcher: InferenceBatcher, image):
+        tiles = await asyncio.to_thread(
+            make_tiles, image, settings.tiling_grid, settings.tiling_overlap, settings.tiling_max_tiles
+        )
+        # The global view and its tiles go to the batcher together and land in one session run
+        predictions = await batcher.infer_many([image, *tiles])
+        metrics.inc('tiled_photos')
+        metrics.inc('tiles', len(tiles))
+        return aggregate(predictions, settings.recognition_threshold)
 
     @staticmethod
-    async def save_result_image(image, object_detected, confidence, segment_id, task_id):
+    def annotate_image(image, object_detected, confidence):
+        max_side = settings.result_image_max_side
+        height, width = image.shape[:2]
+        if max_side and max(height, width) > max_side:
+            scale = max_side / max(height, width)
+            image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
         cv2.putText(image, f'{object_detected}: {confidence:.2f}', (10, 30),
                     cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        return image
+
+    @staticmethod
+    def encode_image(image):
         _, buffer = cv2.imencode('.jpg', image)
-        image_bytes = buffer.tobytes()
+        return buffer.tobytes()
+
+    @classmethod
+    def render_result_image(cls, image, object_detected, confidence):
+        return cls.encode_image(cls.annotate_image(image, object_detected, confidence))
+
+    async def save_result_image(self, image, object_detected, confidence, segment_id, task_id):
+        image_bytes = await asyncio.to_thread(self.render_result_image, image, object_detected, confidence)
 
         result_file_url = f'recognition-results/{task_id}/{segment_id}_result.jpg'
         await save_bytes_to_s3(image_bytes, result_file_url)
         return result_file_url
 
-    @staticmethod
-    async def save_result(result_repo, segment_id, object_detected, confidence, result_file_url):
-        result = RecognitionResult(
-            id=str(uuid.uuid4()),
-            segment_id=segment_id,
-            object_detected=object_detected,
-            confidence=float(confidence),
-            result_file_url=result_file_url,
-            created_at=datetime.now()
-        )
-        await result_repo.create_result(result)
-
 
 async def main():
     worker = RecognitionWorker()
     await worker.initialize()
-    await rmq.consume(settings.recognition_queue, worker.process_message)
+    handler = InFlightLimiter(worker.process_message, settings.recognition_max_in_flight)
+    photo_handler = InFlightLimiter(
+        functools.partial(worker.process_message, lane='photo'), settings.photo_max_in_flight
+    )
+    metrics.register('recognition_in_flight', lambda: handler.in_flight)
+    metrics.register('recognition_waiting', lambda: handler.waiting)
+    metrics.register('photo_in_flight', lambda: photo_handler.in_flight)
+    metrics.register('photo_waiting', lambda: photo_handler.waiting)
+    try:
+        await asyncio.gather(
+            rmq.consume(
+                settings.recognition_queue,
+                handler,
+                prefetch_count=settings.recognition_prefetch_count,
+            ),
+            rmq.consume(
+                settings.photo_recognition_queue,
+                photo_handler,
+                prefetch_count=settings.photo_prefetch_count,
+            ),
+        )
+    finally:
+        await worker.close()
 
 
 if __name__ == "__main__":